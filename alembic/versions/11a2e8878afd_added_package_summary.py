@@ -0,0 +1,97 @@
+"""added package_summary
+
+Revision ID: 11a2e8878afd
+Revises: 7b865d98f048
+Create Date: 2026-10-19 13:41:09.720115
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "11a2e8878afd"
+down_revision = "7b865d98f048"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "package_summary",
+        sa.Column("package_id", sa.String(), nullable=False),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("latest_version", sa.String(), nullable=True),
+        sa.Column("version_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column(
+            "published_version_count",
+            sa.Integer(),
+            nullable=False,
+            server_default="0",
+        ),
+        sa.Column("dependent_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("last_version_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_published_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["package_id"], ["package.id"]),
+        sa.PrimaryKeyConstraint("package_id"),
+    )
+    op.create_index(
+        "ix_package_summary_recent",
+        "package_summary",
+        [sa.text("last_published_at DESC NULLS LAST"), "package_id"],
+    )
+    op.create_index(
+        "ix_package_summary_popular",
+        "package_summary",
+        [sa.text("dependent_count DESC"), "package_id"],
+    )
+    # backfill, publication times of existing versions are unknown
+    op.execute(
+        """
+        INSERT INTO package_summary (
+            package_id,
+            description,
+            latest_version,
+            version_count,
+            published_version_count,
+            dependent_count
+        )
+        SELECT
+            package.id,
+            package.description,
+            (
+                SELECT package_version.version
+                FROM package_version
+                WHERE package_version.package_id = package.id
+                AND package_version.version_prerelease IS NULL
+                ORDER BY
+                    package_version.version_major DESC,
+                    package_version.version_minor DESC,
+                    package_version.version_patch DESC
+                LIMIT 1
+            ),
+            (
+                SELECT count(*)
+                FROM package_version
+                WHERE package_version.package_id = package.id
+            ),
+            (
+                SELECT count(*)
+                FROM package_version
+                WHERE package_version.package_id = package.id
+                AND package_version.published
+            ),
+            (
+                SELECT count(*)
+                FROM package_version_dependency
+                WHERE package_version_dependency.dependency = package.id
+            )
+        FROM package
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_package_summary_popular", table_name="package_summary")
+    op.drop_index("ix_package_summary_recent", table_name="package_summary")
+    op.drop_table("package_summary")
@@ -0,0 +1,31 @@
+"""added package_version.published_generation
+
+Revision ID: 1285a3946c1c
+Revises: c2f749b4f233
+Create Date: 2026-10-19 10:12:41.318204
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "1285a3946c1c"
+down_revision = "c2f749b4f233"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "package_version",
+        sa.Column("published_generation", sa.Integer(), nullable=True),
+    )
+    # versions already published are considered part of the initial generation
+    op.execute(
+        "UPDATE package_version SET published_generation = 0 WHERE published = true"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("package_version", "published_generation")
@@ -0,0 +1,36 @@
+"""added task_outbox
+
+Revision ID: 3f568434c4ad
+Revises: 11a2e8878afd
+Create Date: 2026-10-19 15:22:54.108937
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3f568434c4ad"
+down_revision = "11a2e8878afd"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "task_outbox",
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column("task_name", sa.String(), nullable=False),
+        sa.Column("kwargs", sa.JSON(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("task_outbox")
@@ -0,0 +1,24 @@
+"""added task_outbox.trace_context
+
+Revision ID: 465c7e32527b
+Revises: 5925ec26018a
+Create Date: 2026-10-19 18:05:37.914622
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "465c7e32527b"
+down_revision = "5925ec26018a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("task_outbox", sa.Column("trace_context", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("task_outbox", "trace_context")
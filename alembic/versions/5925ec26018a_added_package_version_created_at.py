@@ -0,0 +1,32 @@
+"""added package_version.created_at
+
+Revision ID: 5925ec26018a
+Revises: 3f568434c4ad
+Create Date: 2026-10-19 16:48:02.631470
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5925ec26018a"
+down_revision = "3f568434c4ad"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "package_version",
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("now()"),
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("package_version", "created_at")
@@ -0,0 +1,93 @@
+"""added package_version semver components
+
+Revision ID: 7b865d98f048
+Revises: 1285a3946c1c
+Create Date: 2026-10-19 11:03:27.550931
+
+"""
+import sqlalchemy as sa
+from semver import Version
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "7b865d98f048"
+down_revision = "1285a3946c1c"
+branch_labels = None
+depends_on = None
+
+package_version_table = sa.table(
+    "package_version",
+    sa.column("package_id", sa.String()),
+    sa.column("version", sa.String()),
+    sa.column("version_major", sa.Integer()),
+    sa.column("version_minor", sa.Integer()),
+    sa.column("version_patch", sa.Integer()),
+    sa.column("version_prerelease", sa.String()),
+)
+
+
+def upgrade() -> None:
+    op.add_column(
+        "package_version", sa.Column("version_major", sa.Integer(), nullable=True)
+    )
+    op.add_column(
+        "package_version", sa.Column("version_minor", sa.Integer(), nullable=True)
+    )
+    op.add_column(
+        "package_version", sa.Column("version_patch", sa.Integer(), nullable=True)
+    )
+    op.add_column(
+        "package_version",
+        sa.Column("version_prerelease", sa.String(), nullable=True),
+    )
+
+    # backfill from the stored version strings
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.select(package_version_table.c.package_id, package_version_table.c.version)
+    ).all()
+    backfill = []
+    for package_id, version in rows:
+        parsed_version = Version.parse(version)
+        backfill.append(
+            {
+                "b_package_id": package_id,
+                "b_version": version,
+                "version_major": parsed_version.major,
+                "version_minor": parsed_version.minor,
+                "version_patch": parsed_version.patch,
+                "version_prerelease": parsed_version.prerelease,
+            }
+        )
+    if backfill:
+        connection.execute(
+            package_version_table.update().where(
+                package_version_table.c.package_id == sa.bindparam("b_package_id"),
+                package_version_table.c.version == sa.bindparam("b_version"),
+            ),
+            backfill,
+        )
+
+    op.alter_column("package_version", "version_major", nullable=False)
+    op.alter_column("package_version", "version_minor", nullable=False)
+    op.alter_column("package_version", "version_patch", nullable=False)
+    op.create_index(
+        "ix_package_version_semver",
+        "package_version",
+        [
+            "package_id",
+            "version_major",
+            "version_minor",
+            "version_patch",
+            "version_prerelease",
+        ],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_package_version_semver", table_name="package_version")
+    op.drop_column("package_version", "version_prerelease")
+    op.drop_column("package_version", "version_patch")
+    op.drop_column("package_version", "version_minor")
+    op.drop_column("package_version", "version_major")
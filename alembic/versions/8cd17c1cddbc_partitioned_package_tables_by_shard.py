@@ -0,0 +1,213 @@
+"""partitioned package and package_version by shard
+
+Opt-in, the tables are only converted when a partitioning method is given:
+
+    alembic -x partitioning=list upgrade head
+    alembic -x partitioning=hash -x partitions=16 upgrade head
+
+``list`` creates a partition per shard, and a default one for the shards
+created later, ``hash`` spreads the shards over ``partitions`` partitions.
+Without a method this revision changes nothing, downgrade to the previous
+revision and upgrade again to partition the tables later.
+
+Unique constraints of partitioned tables include the partition key, the
+primary keys become ``(id, shard_id)`` and ``(package_id, version,
+shard_id)``: the foreign keys referencing them include the shard column the
+referencing tables store (see a36cdb73cc51). The shard of a package is
+derived from its id, the shard count must not change once partitioned.
+Lookups by package id only probe the index of every partition.
+
+Existing rows are copied in the migration transaction.
+
+Revision ID: 8cd17c1cddbc
+Revises: a36cdb73cc51
+Create Date: 2026-10-19 23:41:52.106374
+
+"""
+import sqlalchemy as sa
+
+from alembic import context, op
+
+# revision identifiers, used by Alembic.
+revision = "8cd17c1cddbc"
+down_revision = "a36cdb73cc51"
+branch_labels = None
+depends_on = None
+
+PARTITIONING_METHODS = ["list", "hash"]
+# (table, name, referred table, columns, referred columns, shard column)
+REFERENCING_FOREIGN_KEYS = [
+    (
+        "package_tag",
+        "package_tag_package_id_fkey",
+        "package",
+        ["package_id"],
+        ["id"],
+        "shard_id",
+    ),
+    (
+        "package_summary",
+        "package_summary_package_id_fkey",
+        "package",
+        ["package_id"],
+        ["id"],
+        "shard_id",
+    ),
+    (
+        "package_version_dependency",
+        "package_version_dependency_package_id_version_fkey",
+        "package_version",
+        ["package_id", "version"],
+        ["package_id", "version"],
+        "shard_id",
+    ),
+    (
+        "package_version_dependency",
+        "package_version_dependency_dependency_dependency_version_fkey",
+        "package_version",
+        ["dependency", "dependency_version"],
+        ["package_id", "version"],
+        "dependency_shard_id",
+    ),
+    (
+        "package_version_dependent",
+        "package_version_dependent_package_id_version_fkey",
+        "package_version",
+        ["package_id", "version"],
+        ["package_id", "version"],
+        "shard_id",
+    ),
+    (
+        "package_version_dependent",
+        "package_version_dependent_dependency_dependency_version_fkey",
+        "package_version",
+        ["dependency", "dependency_version"],
+        ["package_id", "version"],
+        "dependency_shard_id",
+    ),
+]
+
+
+def _is_partitioned() -> bool:
+    return op.get_bind().scalar(
+        sa.text("SELECT relkind = 'p' FROM pg_class WHERE oid = 'package'::regclass")
+    )
+
+
+def _create_partitions(table: str, method: str, partition_count: int):
+    if method == "list":
+        shard_ids = op.get_bind().scalars(sa.text("SELECT id FROM shard ORDER BY id"))
+        for shard_id in shard_ids:
+            op.execute(
+                f"CREATE TABLE {table}_shard_{shard_id} PARTITION OF {table} "
+                f"FOR VALUES IN ({shard_id})"
+            )
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+        return
+    for remainder in range(partition_count):
+        op.execute(
+            f"CREATE TABLE {table}_p{remainder} PARTITION OF {table} "
+            f"FOR VALUES WITH (MODULUS {partition_count}, REMAINDER {remainder})"
+        )
+
+
+def _replace_table(table: str, method: str | None, partition_count: int):
+    """Copy the rows of ``table`` into a new table, partitioned by shard when
+    ``method`` is set, which replaces it without any constraint nor index"""
+    op.execute(f"ALTER TABLE {table} RENAME TO {table}_previous")
+    partition_by = f" PARTITION BY {method.upper()} (shard_id)" if method else ""
+    op.execute(
+        f"CREATE TABLE {table} (LIKE {table}_previous INCLUDING DEFAULTS)"
+        + partition_by
+    )
+    if method is not None:
+        _create_partitions(table=table, method=method, partition_count=partition_count)
+    op.execute(f"INSERT INTO {table} SELECT * FROM {table}_previous")
+    op.execute(f"DROP TABLE {table}_previous")
+
+
+def _drop_referencing_foreign_keys():
+    for table, name, *_ in REFERENCING_FOREIGN_KEYS:
+        op.drop_constraint(name, table, type_="foreignkey")
+    op.drop_constraint(
+        "package_version_package_id_fkey", "package_version", type_="foreignkey"
+    )
+
+
+def _create_referencing_foreign_keys(partitioned: bool):
+    for (
+        table,
+        name,
+        referred_table,
+        columns,
+        referred_columns,
+        shard_column,
+    ) in REFERENCING_FOREIGN_KEYS:
+        if partitioned:
+            columns = [*columns, shard_column]
+            referred_columns = [*referred_columns, "shard_id"]
+        op.create_foreign_key(name, table, referred_table, columns, referred_columns)
+
+
+def _create_package_constraints(partitioned: bool):
+    shard_key = ["shard_id"] if partitioned else []
+    op.create_primary_key("package_pkey", "package", ["id", *shard_key])
+    op.create_foreign_key(
+        "package_shard_id_fkey", "package", "shard", ["shard_id"], ["id"]
+    )
+    op.create_primary_key(
+        "package_version_pkey", "package_version", ["package_id", "version", *shard_key]
+    )
+    op.create_foreign_key(
+        "package_version_package_id_fkey",
+        "package_version",
+        "package",
+        ["package_id", *shard_key],
+        ["id", *shard_key],
+    )
+    op.create_foreign_key(
+        "package_version_shard_id_fkey",
+        "package_version",
+        "shard",
+        ["shard_id"],
+        ["id"],
+    )
+    op.create_index(
+        "ix_package_version_semver",
+        "package_version",
+        [
+            "package_id",
+            "version_major",
+            "version_minor",
+            "version_patch",
+            "version_prerelease",
+        ],
+    )
+    op.create_index(
+        "ix_package_version_shard", "package_version", ["shard_id", "package_id"]
+    )
+
+
+def upgrade() -> None:
+    arguments = context.get_x_argument(as_dictionary=True)
+    method = arguments.get("partitioning")
+    if method is None:
+        return
+    if method not in PARTITIONING_METHODS:
+        raise ValueError(f"partitioning must be one of {PARTITIONING_METHODS}")
+    partition_count = int(arguments.get("partitions", "16"))
+    _drop_referencing_foreign_keys()
+    for table in ["package", "package_version"]:
+        _replace_table(table=table, method=method, partition_count=partition_count)
+    _create_package_constraints(partitioned=True)
+    _create_referencing_foreign_keys(partitioned=True)
+
+
+def downgrade() -> None:
+    if not _is_partitioned():
+        return
+    _drop_referencing_foreign_keys()
+    for table in ["package", "package_version"]:
+        _replace_table(table=table, method=None, partition_count=0)
+    _create_package_constraints(partitioned=False)
+    _create_referencing_foreign_keys(partitioned=False)
@@ -0,0 +1,61 @@
+"""added shard_id to the package tables
+
+Every table referencing a package stores the shard of the package, and of
+the dependency package for the dependency tables.
+
+Revision ID: a36cdb73cc51
+Revises: a3c51f9e0b27
+Create Date: 2026-10-19 23:04:17.582931
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a36cdb73cc51"
+down_revision = "a3c51f9e0b27"
+branch_labels = None
+depends_on = None
+
+# (table, shard column, package column)
+SHARD_COLUMNS = [
+    ("package_version", "shard_id", "package_id"),
+    ("package_tag", "shard_id", "package_id"),
+    ("package_summary", "shard_id", "package_id"),
+    ("package_version_dependency", "shard_id", "package_id"),
+    ("package_version_dependency", "dependency_shard_id", "dependency"),
+    ("package_version_dependent", "shard_id", "package_id"),
+    ("package_version_dependent", "dependency_shard_id", "dependency"),
+]
+
+
+def upgrade() -> None:
+    for table, shard_column, package_column in SHARD_COLUMNS:
+        op.add_column(table, sa.Column(shard_column, sa.Integer(), nullable=True))
+        op.execute(
+            f"""
+            UPDATE {table} SET {shard_column} = package.shard_id
+            FROM package WHERE package.id = {table}.{package_column}
+            """
+        )
+        op.alter_column(table, shard_column, nullable=False)
+    op.create_foreign_key(
+        "package_version_shard_id_fkey",
+        "package_version",
+        "shard",
+        ["shard_id"],
+        ["id"],
+    )
+    op.create_index(
+        "ix_package_version_shard", "package_version", ["shard_id", "package_id"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_package_version_shard", table_name="package_version")
+    op.drop_constraint(
+        "package_version_shard_id_fkey", "package_version", type_="foreignkey"
+    )
+    for table, shard_column, _ in SHARD_COLUMNS:
+        op.drop_column(table, shard_column)
@@ -0,0 +1,79 @@
+"""added package_version_dependent
+
+Revision ID: a3c51f9e0b27
+Revises: d8e2b7c41f90
+Create Date: 2026-10-19 21:58:36.504812
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a3c51f9e0b27"
+down_revision = "d8e2b7c41f90"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_package_version_dependency_reverse",
+        "package_version_dependency",
+        ["dependency", "dependency_version"],
+    )
+    op.create_table(
+        "package_version_dependent",
+        sa.Column("dependency", sa.String(), nullable=False),
+        sa.Column("dependency_version", sa.String(), nullable=False),
+        sa.Column("package_id", sa.String(), nullable=False),
+        sa.Column("version", sa.String(), nullable=False),
+        sa.Column("depth", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["dependency", "dependency_version"],
+            ["package_version.package_id", "package_version.version"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["package_id", "version"],
+            ["package_version.package_id", "package_version.version"],
+        ),
+        sa.PrimaryKeyConstraint(
+            "dependency", "dependency_version", "package_id", "version"
+        ),
+    )
+    # backfill the closure of the existing dependencies
+    op.execute(
+        """
+        WITH RECURSIVE closure (
+            dependency, dependency_version, package_id, version, depth
+        ) AS (
+            SELECT dependency, dependency_version, package_id, version, 1
+            FROM package_version_dependency
+            UNION ALL
+            SELECT
+                closure.dependency,
+                closure.dependency_version,
+                package_version_dependency.package_id,
+                package_version_dependency.version,
+                closure.depth + 1
+            FROM closure
+            JOIN package_version_dependency
+            ON package_version_dependency.dependency = closure.package_id
+            AND package_version_dependency.dependency_version = closure.version
+        )
+        INSERT INTO package_version_dependent (
+            dependency, dependency_version, package_id, version, depth
+        )
+        SELECT dependency, dependency_version, package_id, version, min(depth)
+        FROM closure
+        GROUP BY dependency, dependency_version, package_id, version
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("package_version_dependent")
+    op.drop_index(
+        "ix_package_version_dependency_reverse",
+        table_name="package_version_dependency",
+    )
@@ -0,0 +1,42 @@
+"""added shard_rebuild
+
+Revision ID: d8e2b7c41f90
+Revises: 5a6260934d4a
+Create Date: 2026-10-19 20:47:03.118420
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d8e2b7c41f90"
+down_revision = "5a6260934d4a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "shard_rebuild",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column(
+            "started_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    # shards rebuilt since the start of a rebuild are looked up by date
+    op.create_index(
+        "ix_shard_change_shard_id_created_at",
+        "shard_change",
+        ["shard_id", "created_at"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_shard_change_shard_id_created_at", table_name="shard_change")
+    op.drop_table("shard_rebuild")
@@ -0,0 +1,349 @@
+"""Benchmark the shard and index generation on synthetic registries
+
+For each registry size, the registry tables are filled with synthetic
+packages, versions and dependencies, then every stage runs in a fresh
+interpreter with artifacts written to a temporary local storage directory:
+
+- ``shards``: first generation of every shard, publishing every version
+- ``shard_incremental``: one new version published in a generated shard
+- ``index``: whole index and package filter
+
+Each stage reports its wall time, SQL query count, peak RSS and the size of
+the artifacts it wrote. The generation functions run without the Celery
+tasks around them (locks, cooldown). The dependents closure is not filled,
+the generation does not read it.
+
+Versions per package and dependency targets follow a Zipf distribution of
+exponent ``--skew`` (0 for uniform registries): a few packages have most
+versions and are the most depended on, as in real registries.
+
+The registry tables of ``OPAQUE_REGISTRY_DB_URL`` are truncated, use a
+dedicated database migrated to the latest revision.
+
+Usage: ``python -m benchmarks.generation --reset [--sizes 1000,10000] [--versions 5] [--dependencies 3] [--skew 1.0] [--shards 16] [--json]``
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+STAGES = ["shards", "shard_incremental", "index"]
+
+
+def zipf_weights(count: int, skew: float) -> list[float]:
+    return [1 / (rank + 1) ** skew for rank in range(count)]
+
+
+def generate_registry(
+    package_count: int,
+    versions_per_package: float,
+    max_dependencies: int,
+    skew: float,
+    shard_count: int,
+    seed: int,
+    published: bool = False,
+) -> dict[str, int]:
+    """Fill the registry tables with a synthetic registry
+
+    :param published: versions are already published, as in a live registry
+    :returns: the amount of rows of each kind
+    """
+    from opaque_registry.database.connector import (
+        create_sync_db_sessionmaker,
+        init_sync_db_engine,
+    )
+    from opaque_registry.database.models.base import Base
+    from opaque_registry.sharding import derive_shard_id_from_package_id
+
+    rng = random.Random(seed)
+    weights = zipf_weights(package_count, skew)
+    weights_total = sum(weights)
+    version_counts = [
+        max(1, round(weight / weights_total * package_count * versions_per_package))
+        for weight in weights
+    ]
+    init_sync_db_engine()
+    with create_sync_db_sessionmaker()() as session:
+        tables = ", ".join(f'"{table.name}"' for table in Base.metadata.sorted_tables)
+        cursor = session.connection().connection.cursor()
+        cursor.execute(f"TRUNCATE {tables} CASCADE")
+        with cursor.copy("COPY shard (id, location, generation) FROM STDIN") as copy:
+            for shard_id in range(shard_count):
+                copy.write_row((shard_id, "", 0))
+        # shards are derived from a hash, popular packages spread over them
+        package_ids = [f"package-{index}" for index in range(package_count)]
+        package_versions = {
+            package_id: [f"{major}.{minor}.0" for major, minor in _versions(count)]
+            for package_id, count in zip(package_ids, version_counts)
+        }
+        package_shard_ids = {
+            package_id: derive_shard_id_from_package_id(
+                package_id=package_id, shard_count=shard_count
+            )
+            for package_id in package_ids
+        }
+        with cursor.copy(
+            "COPY package (id, description, meta, shard_id) FROM STDIN"
+        ) as copy:
+            for package_id in package_ids:
+                copy.write_row(
+                    (
+                        package_id,
+                        f"synthetic package {package_id}",
+                        False,
+                        package_shard_ids[package_id],
+                    )
+                )
+        # publications update the summaries
+        with cursor.copy(
+            "COPY package_summary "
+            "(package_id, description, latest_version, version_count, shard_id) "
+            "FROM STDIN"
+        ) as copy:
+            for package_id, versions in package_versions.items():
+                copy.write_row(
+                    (
+                        package_id,
+                        f"synthetic package {package_id}",
+                        versions[-1],
+                        len(versions),
+                        package_shard_ids[package_id],
+                    )
+                )
+        with cursor.copy(
+            "COPY package_version (package_id, version, url, published, "
+            "published_generation, version_major, version_minor, version_patch, "
+            "shard_id) FROM STDIN"
+        ) as copy:
+            for package_id, versions in package_versions.items():
+                for version in versions:
+                    major, minor, patch = map(int, version.split("."))
+                    copy.write_row(
+                        (
+                            package_id,
+                            version,
+                            f"https://example.com/{package_id}/{version}.zip",
+                            published,
+                            0 if published else None,
+                            major,
+                            minor,
+                            patch,
+                            package_shard_ids[package_id],
+                        )
+                    )
+        dependency_count = 0
+        with cursor.copy(
+            "COPY package_version_dependency "
+            "(package_id, version, shard_id, dependency, dependency_version, "
+            "dependency_shard_id) FROM STDIN"
+        ) as copy:
+            for index, (package_id, versions) in enumerate(package_versions.items()):
+                # only on more popular packages, the graph has no cycle
+                if index == 0:
+                    continue
+                for version in versions:
+                    dependencies = {
+                        package_ids[dependency_index]
+                        for dependency_index in rng.choices(
+                            range(index),
+                            weights=weights[:index],
+                            k=rng.randint(0, max_dependencies),
+                        )
+                    }
+                    for dependency in dependencies:
+                        copy.write_row(
+                            (
+                                package_id,
+                                version,
+                                package_shard_ids[package_id],
+                                dependency,
+                                rng.choice(package_versions[dependency]),
+                                package_shard_ids[dependency],
+                            )
+                        )
+                        dependency_count += 1
+        session.commit()
+    return {
+        "packages": package_count,
+        "versions": sum(version_counts),
+        "dependencies": dependency_count,
+        "max_versions_per_package": max(version_counts),
+        "shards": shard_count,
+    }
+
+
+def _versions(count: int):
+    for index in range(count):
+        yield index // 10 + 1, index % 10
+
+
+def _directory_size(path: Path) -> int:
+    return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+
+
+def measure_stage(stage: str, storage_dir: str) -> dict:
+    """Run a stage in this interpreter, which must not have run another"""
+    from sqlalchemy import event, func, select
+
+    import opaque_registry.database.connector as connector
+    import opaque_registry.database.models as db_models
+    from opaque_registry.async_tasks.shards.generation import (
+        generate_shard,
+        generate_whole_index,
+    )
+
+    connector.init_sync_db_engine()
+    queries = 0
+
+    def count_query(*args):
+        nonlocal queries
+        queries += 1
+
+    with connector.create_sync_db_sessionmaker()() as session:
+        shard_ids = session.scalars(
+            select(db_models.Shard.id).order_by(db_models.Shard.id)
+        ).all()
+        if stage == "shard_incremental":
+            # a new version of the most popular package
+            package_id, shard_id, version_count = session.execute(
+                select(
+                    db_models.Package.id,
+                    db_models.Package.shard_id,
+                    func.count(db_models.PackageVersion.version),
+                )
+                .join(db_models.PackageVersion)
+                .group_by(db_models.Package.id, db_models.Package.shard_id)
+                .order_by(func.count(db_models.PackageVersion.version).desc())
+                .limit(1)
+            ).one()
+            session.add(
+                db_models.PackageVersion(
+                    package_id=package_id,
+                    version=f"{version_count + 1000}.0.0",
+                    url="https://example.com/incremental.zip",
+                    version_major=version_count + 1000,
+                    version_minor=0,
+                    version_patch=0,
+                    shard_id=shard_id,
+                )
+            )
+            session.commit()
+    size_before = _directory_size(Path(storage_dir))
+    event.listen(connector.SYNC_ENGINE, "before_cursor_execute", count_query)
+    start = time.perf_counter()
+    if stage == "shards":
+        for shard_id in shard_ids:
+            generate_shard(shard_id=shard_id)
+    elif stage == "shard_incremental":
+        generate_shard(shard_id=shard_id)
+    else:
+        generate_whole_index()
+    wall_time = time.perf_counter() - start
+    event.remove(connector.SYNC_ENGINE, "before_cursor_execute", count_query)
+    return {
+        "stage": stage,
+        "wall_time_s": round(wall_time, 3),
+        "queries": queries,
+        # kilobytes on Linux
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        "artifact_bytes": _directory_size(Path(storage_dir)) - size_before,
+    }
+
+
+def run_stage(stage: str, storage_dir: str) -> dict:
+    """Measure a stage in a fresh interpreter, its peak RSS is its own"""
+    env = {
+        **os.environ,
+        "OPAQUE_REGISTRY_STORAGE": "local",
+        "OPAQUE_REGISTRY_LOCAL_STORAGE_DIR": storage_dir,
+    }
+    process = subprocess.run(
+        [sys.executable, "-m", "benchmarks.generation", "--measure", stage],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    return json.loads(process.stdout.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--reset",
+        action="store_true",
+        help="confirm the registry tables of the database can be truncated",
+    )
+    parser.add_argument(
+        "--sizes", default="1000,10000", help="comma separated package counts"
+    )
+    parser.add_argument("--versions", type=float, default=5, help="per package")
+    parser.add_argument("--dependencies", type=int, default=3, help="per version")
+    parser.add_argument("--skew", type=float, default=1.0)
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    parser.add_argument("--measure", choices=STAGES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure is not None:
+        print(
+            json.dumps(
+                measure_stage(
+                    stage=args.measure,
+                    storage_dir=os.environ["OPAQUE_REGISTRY_LOCAL_STORAGE_DIR"],
+                )
+            )
+        )
+        return
+    if not args.reset:
+        parser.error("the registry tables are truncated, confirm with --reset")
+
+    reports = []
+    for package_count in map(int, args.sizes.split(",")):
+        registry = generate_registry(
+            package_count=package_count,
+            versions_per_package=args.versions,
+            max_dependencies=args.dependencies,
+            skew=args.skew,
+            shard_count=args.shards,
+            seed=args.seed,
+        )
+        with tempfile.TemporaryDirectory() as storage_dir:
+            stages = [run_stage(stage, storage_dir) for stage in STAGES]
+        reports.append({"registry": registry, "stages": stages})
+        if not args.json:
+            print(
+                f"{registry['packages']} packages, {registry['versions']} versions, "
+                f"{registry['dependencies']} dependencies"
+            )
+            for stage in stages:
+                print(
+                    f"  {stage['stage']:<18} {stage['wall_time_s']:>8.3f}s "
+                    f"{stage['queries']:>6} queries "
+                    f"{stage['peak_rss_mb']:>8.1f}MB peak RSS "
+                    f"{stage['artifact_bytes']:>12} artifact bytes"
+                )
+    if args.json:
+        print(
+            json.dumps(
+                {
+                    "skew": args.skew,
+                    "seed": args.seed,
+                    "registries": reports,
+                },
+                indent=2,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""Load test the package API with concurrent clients
+
+Seeds the registry tables with a synthetic registry (see
+``benchmarks.generation``), then drives the API in-process through an ASGI
+transport, one endpoint after the other, with ``--concurrency`` clients
+sending ``--requests`` requests in total:
+
+- ``list``: ``GET /packages/``
+- ``get``: ``GET /packages/{package_id}``
+- ``get_unknown``: ``GET /packages/{package_id}`` of a package which does
+  not exist, answered with a 404
+- ``versions``: ``GET /packages/{package_id}/versions``
+- ``create_version``: ``POST /packages/{package_id}/versions``
+Packages are picked with the same Zipf skew as the registry, popular ones
+are requested the most. Each endpoint reports its p50/p95/p99 latency,
+throughput, error count and SQL queries per request. Clients share the
+event loop of the API, latencies include their overhead.
+
+No Redis nor Celery broker is needed: the outbox dispatcher runs in the
+process with a sender only counting the tasks, the embedded publisher is
+disabled. The other ``OPAQUE_REGISTRY_*`` settings apply, to compare the
+snapshot or package filter modes for instance.
+The registry tables of ``OPAQUE_REGISTRY_DB_URL`` are truncated, use a
+dedicated database migrated to the latest revision.
+
+Usage: ``python -m benchmarks.http_load --reset [--packages 1000] [--requests 500] [--concurrency 16] [--endpoints list,get,get_unknown,versions,create_version] [--json]``
+"""
+import argparse
+import asyncio
+import contextvars
+import itertools
+import json
+import os
+import random
+import statistics
+import time
+
+from benchmarks.generation import generate_registry, zipf_weights
+
+ENDPOINTS = ["list", "get", "get_unknown", "versions", "create_version"]
+
+# queries sent by the request being handled, None outside requests
+_request_queries: contextvars.ContextVar[list[int] | None] = contextvars.ContextVar(
+    "request_queries", default=None
+)
+
+
+def count_query(*args):
+    request_queries = _request_queries.get()
+    if request_queries is not None:
+        request_queries[0] += 1
+
+
+class Workload:
+    def __init__(self, package_count: int, skew: float, seed: int):
+        self.rng = random.Random(seed)
+        self.package_indexes = range(package_count)
+        self.weights = zipf_weights(package_count, skew)
+        self.versions = itertools.count()
+        self.unknown_packages = itertools.count()
+
+    def _pick_package(self) -> int:
+        return self.rng.choices(self.package_indexes, weights=self.weights)[0]
+
+    def request(self, endpoint: str) -> tuple[str, str, dict | None]:
+        """:returns: the method, path and JSON body of the next request"""
+        if endpoint == "list":
+            return "GET", "/packages/", None
+        if endpoint == "get_unknown":
+            return "GET", f"/packages/unknown-{next(self.unknown_packages)}", None
+        package_index = self._pick_package()
+        if endpoint == "get":
+            return "GET", f"/packages/package-{package_index}", None
+        if endpoint == "versions":
+            return "GET", f"/packages/package-{package_index}/versions", None
+        # every synthetic package has a 1.0.0 version, dependencies only go
+        # to more popular packages like in the seeded registry
+        dependencies = [
+            {"package_id": f"package-{dependency_index}", "version": "1.0.0"}
+            for dependency_index in {
+                self.rng.randrange(package_index) for _ in range(2) if package_index
+            }
+        ]
+        return (
+            "POST",
+            f"/packages/package-{package_index}/versions",
+            {
+                "version": f"{1000 + next(self.versions)}.0.0",
+                "url": "https://example.com/load.zip",
+                "dependencies": dependencies,
+            },
+        )
+
+
+async def run_requests(
+    client, workload: Workload, endpoint: str, request_count: int, concurrency: int
+) -> tuple[list[float], list[int], int]:
+    """:returns: the latency and query count of each request, and the error
+    count"""
+    latencies = []
+    queries = []
+    errors = 0
+    remaining = iter(range(request_count))
+
+    async def run_client():
+        nonlocal errors
+        for _ in remaining:
+            method, path, body = workload.request(endpoint)
+            request_queries = [0]
+            _request_queries.set(request_queries)
+            start = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            latencies.append(time.perf_counter() - start)
+            _request_queries.set(None)
+            queries.append(request_queries[0])
+            if (
+                response.status_code != 404
+                if endpoint == "get_unknown"
+                else response.status_code >= 400
+            ):
+                errors += 1
+
+    await asyncio.gather(*(run_client() for _ in range(concurrency)))
+    return latencies, queries, errors
+
+
+async def run_endpoint(
+    client, workload: Workload, endpoint: str, request_count: int, concurrency: int
+) -> dict:
+    start = time.perf_counter()
+    latencies, queries, errors = await run_requests(
+        client, workload, endpoint, request_count, concurrency
+    )
+    wall_time = time.perf_counter() - start
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "endpoint": endpoint,
+        "requests": request_count,
+        "errors": errors,
+        "throughput_rps": round(request_count / wall_time, 1),
+        "p50_ms": round(percentiles[49] * 1000, 2),
+        "p95_ms": round(percentiles[94] * 1000, 2),
+        "p99_ms": round(percentiles[98] * 1000, 2),
+        "queries_per_request": round(statistics.fmean(queries), 2),
+    }
+
+
+async def run_load(args: argparse.Namespace) -> list[dict]:
+    # imported once the settings are overridden, they are read on import
+    import httpx
+    from sqlalchemy import event
+
+    import opaque_registry.database.connector as connector
+    from opaque_registry.async_tasks.outbox import run_outbox_dispatcher
+    from opaque_registry.main import app
+
+    dispatched_tasks = 0
+
+    async def count_task(task_name: str, trace_context: dict[str, str], **kwargs):
+        nonlocal dispatched_tasks
+        dispatched_tasks += 1
+
+    workload = Workload(package_count=args.packages, skew=args.skew, seed=args.seed)
+    reports = []
+    async with app.router.lifespan_context(app):
+        event.listen(connector.ENGINE.sync_engine, "before_cursor_execute", count_query)
+        outbox_dispatcher = asyncio.create_task(run_outbox_dispatcher(send=count_task))
+        async with httpx.AsyncClient(
+            # unhandled exceptions are answered with a 500, as by a server
+            transport=httpx.ASGITransport(app=app, raise_app_exceptions=False),
+            base_url="http://registry",
+        ) as client:
+            for endpoint in args.endpoints.split(","):
+                # warms the connection pool and caches, not measured
+                await run_requests(
+                    client, workload, endpoint, args.warmup, args.concurrency
+                )
+                reports.append(
+                    await run_endpoint(
+                        client, workload, endpoint, args.requests, args.concurrency
+                    )
+                )
+        outbox_dispatcher.cancel()
+        await asyncio.gather(outbox_dispatcher, return_exceptions=True)
+    for report in reports:
+        if report["endpoint"] == "create_version":
+            report["dispatched_tasks"] = dispatched_tasks
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--reset",
+        action="store_true",
+        help="confirm the registry tables of the database can be truncated",
+    )
+    parser.add_argument("--packages", type=int, default=1000)
+    parser.add_argument("--versions", type=float, default=5, help="per package")
+    parser.add_argument("--dependencies", type=int, default=3, help="per version")
+    parser.add_argument("--skew", type=float, default=1.0)
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=500, help="per endpoint")
+    parser.add_argument("--warmup", type=int, default=20, help="per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args()
+    if not args.reset:
+        parser.error("the registry tables are truncated, confirm with --reset")
+    if args.requests < 2:
+        parser.error("--requests must be at least 2 to compute percentiles")
+    unknown_endpoints = set(args.endpoints.split(",")) - set(ENDPOINTS)
+    if unknown_endpoints:
+        parser.error(f"unknown endpoints {sorted(unknown_endpoints)}")
+
+    # stand-ins for the broker, see the module docstring
+    os.environ["OPAQUE_REGISTRY_OUTBOX_DISPATCHER"] = "0"
+    os.environ["OPAQUE_REGISTRY_EMBEDDED"] = "0"
+    registry = generate_registry(
+        package_count=args.packages,
+        versions_per_package=args.versions,
+        max_dependencies=args.dependencies,
+        skew=args.skew,
+        shard_count=args.shards,
+        seed=args.seed,
+        # versions can only depend on published ones
+        published=True,
+    )
+    reports = asyncio.run(run_load(args))
+
+    if args.json:
+        print(
+            json.dumps(
+                {
+                    "registry": registry,
+                    "concurrency": args.concurrency,
+                    "endpoints": reports,
+                },
+                indent=2,
+            )
+        )
+        return
+    print(
+        f"{registry['packages']} packages, {registry['versions']} versions, "
+        f"{args.concurrency} concurrent clients"
+    )
+    for report in reports:
+        print(
+            f"  {report['endpoint']:<15} {report['throughput_rps']:>8.1f} req/s "
+            f"p50 {report['p50_ms']:>7.2f}ms p95 {report['p95_ms']:>7.2f}ms "
+            f"p99 {report['p99_ms']:>7.2f}ms "
+            f"{report['queries_per_request']:>5.2f} queries/req "
+            f"{report['errors']} errors"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Measure the import time of the API entry point
+
+Runs ``python -X importtime`` in fresh interpreters and reports the cumulative
+import time of the module, its slowest dependencies and whether modules which
+must stay out of the API process (worker code, boto3) were imported.
+
+Usage: ``python -m benchmarks.import_time [--module opaque_registry.main] [--runs 5] [--json]``
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# modules the API process should never import
+FORBIDDEN_MODULES = [
+    "boto3",
+    "botocore",
+    "celery",
+    "opaque_registry.async_tasks.shards.tasks",
+]
+
+
+def measure_import(module: str) -> dict[str, int]:
+    """Import ``module`` in a fresh interpreter and return the cumulative
+    import time (in microseconds) of every imported module"""
+    env = {
+        "OPAQUE_REGISTRY_DB_URL": "postgresql://localhost/opaque_registry",
+        **os.environ,
+    }
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    timings = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self_us, cumulative_us, name = line.split("|")
+        timings[name.strip()] = int(cumulative_us)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="opaque_registry.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args()
+
+    runs = [measure_import(args.module) for _ in range(args.runs)]
+    totals_ms = [run[args.module] / 1000 for run in runs]
+    last_run = runs[-1]
+    top_level_modules = sorted(
+        (
+            (name, cumulative_us / 1000)
+            for name, cumulative_us in last_run.items()
+            if "." not in name and name != args.module
+        ),
+        key=lambda item: item[1],
+        reverse=True,
+    )[: args.top]
+    forbidden_imports = [name for name in FORBIDDEN_MODULES if name in last_run]
+    report = {
+        "module": args.module,
+        "runs": args.runs,
+        "median_ms": round(statistics.median(totals_ms), 2),
+        "min_ms": round(min(totals_ms), 2),
+        "max_ms": round(max(totals_ms), 2),
+        "imported_modules": len(last_run),
+        "slowest_top_level_imports_ms": dict(top_level_modules),
+        "forbidden_imports": forbidden_imports,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(
+            f"{args.module}: median {report['median_ms']}ms "
+            f"(min {report['min_ms']}ms, max {report['max_ms']}ms, "
+            f"{report['imported_modules']} modules)"
+        )
+        for name, duration_ms in top_level_modules:
+            print(f"  {name:<30} {duration_ms:>8.2f}ms")
+        if forbidden_imports:
+            print(f"forbidden imports: {', '.join(forbidden_imports)}")
+    sys.exit(1 if forbidden_imports else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""Administration commands of the registry
+
+``rebuild-shards`` republishes every shard, then rebuilds the index once.
+Shards are either sent to the ``maintenance`` queue, at most ``--concurrency``
+at a time, or generated by a local process pool with ``--local``. An interrupted
+rebuild is continued with ``--resume``, shards published since it started
+are not rebuilt again.
+
+``profile-task`` sends a shard or index task run under a profiler, the profile
+is stored next to the generated artifact (see ``opaque_registry.profiling``).
+
+Usage: ``python -m opaque_registry.admin rebuild-shards [--concurrency 16] [--local] [--resume]``
+Usage: ``python -m opaque_registry.admin profile-task {shard <shard_id>,index} [--mode wall]``
+"""
+import argparse
+import asyncio
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import opaque_registry.services.shards as shards_service
+from opaque_registry.async_tasks.dispatch import (
+    CREATE_SHARD_TASK,
+    CREATE_WHOLE_INDEX_TASK,
+    MAINTENANCE_QUEUE,
+    send_task,
+)
+from opaque_registry.database.connector import (
+    create_async_db_sessionmaker,
+    dispose_async_db_engine,
+    init_async_db_engine,
+)
+from opaque_registry.event_loop import install_event_loop_policy
+from opaque_registry.profiling import ProfileMode
+
+logger = logging.getLogger(__name__)
+
+REBUILD_POLL_INTERVAL = 2
+
+
+def _rebuild_shard_locally(shard_id: int):
+    # imported in the pool processes only
+    from opaque_registry.async_tasks.shards.tasks import create_shard_task
+
+    create_shard_task(shard_id=shard_id, cooldown=False)
+
+
+def _rebuild_index_locally():
+    from opaque_registry.async_tasks.shards.tasks import create_whole_index_task
+
+    create_whole_index_task()
+
+
+class ShardRebuilder:
+    def __init__(self, concurrency: int, task_timeout: float):
+        self.concurrency = concurrency
+        self.task_timeout = task_timeout
+        self.async_sessionmaker = create_async_db_sessionmaker()
+        self.shard_rebuild = None
+        self.shard_ids = []
+
+    async def start(self, resume: bool):
+        async with self.async_sessionmaker() as db_session, db_session.begin():
+            if resume:
+                self.shard_rebuild = await shards_service.get_unfinished_shard_rebuild(
+                    db_session=db_session
+                )
+            if self.shard_rebuild is None:
+                self.shard_rebuild = await shards_service.start_shard_rebuild(
+                    db_session=db_session
+                )
+            self.shard_ids = await shards_service.get_all_shard_ids(
+                db_session=db_session
+            )
+        logger.info(
+            f"[Rebuild {self.shard_rebuild.id}] started at "
+            f"{self.shard_rebuild.started_at}, {len(self.shard_ids)} shards"
+        )
+
+    async def get_rebuilt_shard_ids(self) -> set[int]:
+        async with self.async_sessionmaker() as db_session:
+            rebuilt_shard_ids = await shards_service.get_rebuilt_shard_ids(
+                db_session=db_session, shard_rebuild=self.shard_rebuild
+            )
+        logger.info(
+            f"[Rebuild {self.shard_rebuild.id}] "
+            f"{len(rebuilt_shard_ids)}/{len(self.shard_ids)} shards rebuilt"
+        )
+        return rebuilt_shard_ids
+
+    async def finish(self):
+        async with self.async_sessionmaker() as db_session, db_session.begin():
+            await shards_service.finish_shard_rebuild(
+                db_session=db_session, shard_rebuild=self.shard_rebuild
+            )
+        logger.info(f"[Rebuild {self.shard_rebuild.id}] finished")
+
+    async def rebuild_with_celery(self) -> bool:
+        # shard_id -> time the task was sent
+        sent_at = {}
+        while True:
+            rebuilt_shard_ids = await self.get_rebuilt_shard_ids()
+            pending_shard_ids = [
+                shard_id
+                for shard_id in self.shard_ids
+                if shard_id not in rebuilt_shard_ids
+            ]
+            if not pending_shard_ids:
+                break
+            now = time.monotonic()
+            in_flight = {
+                shard_id
+                for shard_id, task_sent_at in sent_at.items()
+                if shard_id not in rebuilt_shard_ids
+                and now - task_sent_at < self.task_timeout
+            }
+            for shard_id in pending_shard_ids:
+                if len(in_flight) >= self.concurrency:
+                    break
+                if shard_id in in_flight:
+                    continue
+                if shard_id in sent_at:
+                    logger.warning(
+                        f"[Rebuild {self.shard_rebuild.id}] shard {shard_id} "
+                        f"not rebuilt after {self.task_timeout}s, sending it again"
+                    )
+                # publications of new versions keep their own queue
+                await asyncio.to_thread(
+                    send_task,
+                    CREATE_SHARD_TASK,
+                    queue=MAINTENANCE_QUEUE,
+                    shard_id=shard_id,
+                    cooldown=False,
+                )
+                sent_at[shard_id] = now
+                in_flight.add(shard_id)
+            await asyncio.sleep(REBUILD_POLL_INTERVAL)
+        await asyncio.to_thread(send_task, CREATE_WHOLE_INDEX_TASK)
+        return True
+
+    async def rebuild_locally(self) -> bool:
+        loop = asyncio.get_running_loop()
+        rebuilt_shard_ids = await self.get_rebuilt_shard_ids()
+        with ProcessPoolExecutor(max_workers=self.concurrency) as pool:
+            shard_futures = {
+                loop.run_in_executor(pool, _rebuild_shard_locally, shard_id): shard_id
+                for shard_id in self.shard_ids
+                if shard_id not in rebuilt_shard_ids
+            }
+            for shard_future in asyncio.as_completed(shard_futures):
+                try:
+                    await shard_future
+                except Exception:
+                    logger.exception(f"[Rebuild {self.shard_rebuild.id}] shard failed")
+                else:
+                    await self.get_rebuilt_shard_ids()
+            missing_shard_ids = set(self.shard_ids) - await self.get_rebuilt_shard_ids()
+            if missing_shard_ids:
+                logger.error(
+                    f"[Rebuild {self.shard_rebuild.id}] shards "
+                    f"{sorted(missing_shard_ids)} were not rebuilt, "
+                    "run again with --resume"
+                )
+                return False
+            logger.info(f"[Rebuild {self.shard_rebuild.id}] rebuilding index")
+            await loop.run_in_executor(pool, _rebuild_index_locally)
+        return True
+
+
+async def rebuild_shards(
+    concurrency: int, local: bool, resume: bool, task_timeout: float
+) -> bool:
+    init_async_db_engine()
+    try:
+        shard_rebuilder = ShardRebuilder(
+            concurrency=concurrency, task_timeout=task_timeout
+        )
+        await shard_rebuilder.start(resume=resume)
+        if local:
+            rebuilt = await shard_rebuilder.rebuild_locally()
+        else:
+            rebuilt = await shard_rebuilder.rebuild_with_celery()
+        if rebuilt:
+            await shard_rebuilder.finish()
+        return rebuilt
+    finally:
+        await dispose_async_db_engine()
+
+
+def send_profiled_task(task: str, shard_id: int | None, mode: ProfileMode) -> bool:
+    """:returns: False if an identical task is still pending"""
+    if task == "shard":
+        sent_task = send_task(CREATE_SHARD_TASK, shard_id=shard_id, profile=mode.value)
+    else:
+        sent_task = send_task(CREATE_WHOLE_INDEX_TASK, profile=mode.value)
+    if sent_task is None:
+        logger.error(f"[Profile] an identical {task} task is still pending")
+        return False
+    logger.info(f"[Profile] sent {task} task {sent_task.id}")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = subparsers.add_parser(
+        "rebuild-shards", help="republish every shard, then the index"
+    )
+    rebuild_parser.add_argument("--concurrency", type=int, default=16)
+    rebuild_parser.add_argument(
+        "--local", action="store_true", help="use a local process pool"
+    )
+    rebuild_parser.add_argument(
+        "--resume", action="store_true", help="continue the last unfinished rebuild"
+    )
+    rebuild_parser.add_argument(
+        "--task-timeout",
+        type=float,
+        default=600,
+        help="seconds before a shard task is sent again",
+    )
+    profile_parser = subparsers.add_parser(
+        "profile-task", help="run a shard or index task under a profiler"
+    )
+    profile_parser.add_argument("task", choices=["shard", "index"])
+    profile_parser.add_argument("shard_id", type=int, nargs="?")
+    profile_parser.add_argument(
+        "--mode", choices=[mode.value for mode in ProfileMode], default="wall"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "profile-task":
+        if (args.task == "shard") != (args.shard_id is not None):
+            profile_parser.error("shard_id is required by shard tasks only")
+        sent = send_profiled_task(
+            task=args.task, shard_id=args.shard_id, mode=ProfileMode(args.mode)
+        )
+        raise SystemExit(0 if sent else 1)
+    install_event_loop_policy()
+    rebuilt = asyncio.run(
+        rebuild_shards(
+            concurrency=args.concurrency,
+            local=args.local,
+            resume=args.resume,
+            task_timeout=args.task_timeout,
+        )
+    )
+    raise SystemExit(0 if rebuilt else 1)
+
+
+if __name__ == "__main__":
+    main()
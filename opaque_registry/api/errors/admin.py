@@ -0,0 +1,19 @@
+from opaque_registry.api.errors.base import ApiException
+
+
+class InvalidAdminTokenError(ApiException):
+    def __init__(self):
+        super().__init__(
+            status_code=401,
+            message="Missing or invalid admin token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+class ProfileAlreadyRunningError(ApiException):
+    def __init__(self, pid: int):
+        super().__init__(
+            status_code=409,
+            message=f"A profile of worker {pid} is already running",
+            details={"pid": pid},
+        )
@@ -0,0 +1,24 @@
+from opaque_registry.api.errors.base import ApiException
+
+
+class ArchiveNotFoundError(ApiException):
+    def __init__(self, sha256: str):
+        super().__init__(
+            status_code=404,
+            message=f"Archive with sha256 '{sha256}' not found",
+            details={"sha256": sha256},
+        )
+
+
+class ArchiveTooLargeError(ApiException):
+    def __init__(self, max_size: int):
+        super().__init__(
+            status_code=413,
+            message=f"Archives can't be larger than {max_size} bytes",
+            details={"max_size": max_size},
+        )
+
+
+class EmptyArchiveError(ApiException):
+    def __init__(self):
+        super().__init__(status_code=400, message="Archive is empty")
@@ -48,3 +48,21 @@ class SelfReferencingPackageError(ApiException):
                 "dependency": dependency,
             },
         )
+
+
+class PackageVersionNotFoundError(ApiException):
+    def __init__(self, package_id: str, constraint: str | None = None):
+        super().__init__(
+            status_code=404,
+            message=f"No version of package '{package_id}' matches '{constraint or '*'}'",
+            details={"package_id": package_id, "constraint": constraint},
+        )
+
+
+class InvalidVersionConstraintError(ApiException):
+    def __init__(self, constraint: str, reason: str):
+        super().__init__(
+            status_code=422,
+            message=f"Invalid version constraint '{constraint}': {reason}",
+            details={"constraint": constraint},
+        )
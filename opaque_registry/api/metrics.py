@@ -0,0 +1,103 @@
+"""Prometheus metrics of the API
+
+Metrics are recorded by a plain ASGI middleware and exposed on ``/metrics``.
+When running several workers, set ``PROMETHEUS_MULTIPROC_DIR`` to an empty
+directory so every worker's metrics are aggregated on scrape.
+"""
+import os
+import time
+
+from fastapi import Request
+from fastapi.exception_handlers import http_exception_handler
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from opaque_registry.api.errors.base import ApiException
+
+REQUEST_DURATION = Histogram(
+    "opaque_registry_http_request_duration_seconds",
+    "Duration of HTTP requests by route template",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+RESPONSE_SIZE = Histogram(
+    "opaque_registry_http_response_size_bytes",
+    "Size of HTTP response bodies by route template",
+    ["method", "route"],
+    buckets=(100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000),
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "opaque_registry_http_requests_in_progress",
+    "HTTP requests currently being processed",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+API_ERRORS = Counter(
+    "opaque_registry_api_errors_total",
+    "API errors returned to clients by error type",
+    ["error"],
+)
+
+# requests not matching any route share a label to bound cardinality
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class PrometheusMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        response_size = 0
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code, response_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method=method)
+        in_progress.inc()
+        request_start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_progress.dec()
+            # the router stores the matched route in the scope
+            route = scope.get("route")
+            route_template = route.path if route is not None else UNMATCHED_ROUTE
+            REQUEST_DURATION.labels(
+                method=method, route=route_template, status=status_code
+            ).observe(time.perf_counter() - request_start)
+            RESPONSE_SIZE.labels(method=method, route=route_template).observe(
+                response_size
+            )
+
+
+async def api_exception_handler(request: Request, exc: ApiException):
+    API_ERRORS.labels(error=type(exc).__name__).inc()
+    return await http_exception_handler(request, exc)
+
+
+def generate_metrics() -> bytes:
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
@@ -1,10 +1,29 @@
 from fastapi import FastAPI
 
+from opaque_registry.api.routes.admin import ADMIN_TOKEN
+from opaque_registry.api.routes.admin import router as admin_router
+from opaque_registry.api.routes.archive import router as archive_router
+from opaque_registry.api.routes.metrics import router as metrics_router
 from opaque_registry.api.routes.package import router as package_router
+from opaque_registry.api.routes.shard import router as shard_router
+from opaque_registry.api.routes.snapshot import router as snapshot_router
+from opaque_registry.api.routes.summary import router as summary_router
+from opaque_registry.services.snapshot import SNAPSHOT_ENABLED
 
-ROUTERS = {"package": package_router}
+ROUTERS = {
+    "package": package_router,
+    "summary": summary_router,
+    "shard": shard_router,
+    "metrics": metrics_router,
+    "archive": archive_router,
+}
 
 
 def load_routers(app: FastAPI):
+    if SNAPSHOT_ENABLED:
+        # first match wins, package reads are answered by the snapshot
+        app.include_router(snapshot_router)
     for router in ROUTERS.values():
         app.include_router(router)
+    if ADMIN_TOKEN is not None:
+        app.include_router(admin_router)
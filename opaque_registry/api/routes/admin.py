@@ -0,0 +1,54 @@
+"""Administration routes, only served when ``OPAQUE_REGISTRY_ADMIN_TOKEN`` is
+set and to requests bearing it (``Authorization: Bearer <token>``)"""
+import asyncio
+import os
+import secrets
+
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import PlainTextResponse
+
+from opaque_registry.api.errors.admin import (
+    InvalidAdminTokenError,
+    ProfileAlreadyRunningError,
+)
+from opaque_registry.profiling import ProfileMode, SamplingProfiler
+
+ADMIN_TOKEN = os.getenv("OPAQUE_REGISTRY_ADMIN_TOKEN")
+PROFILE_MAX_DURATION = float(os.getenv("OPAQUE_REGISTRY_PROFILE_MAX_DURATION", "60"))
+
+
+async def require_admin_token(authorization: str | None = Header(default=None)):
+    scheme, _, token = (authorization or "").partition(" ")
+    if (
+        ADMIN_TOKEN is None
+        or scheme.lower() != "bearer"
+        or not secrets.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+    ):
+        raise InvalidAdminTokenError()
+
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    dependencies=[Depends(require_admin_token)],
+    include_in_schema=False,
+)
+
+_profile_lock = asyncio.Lock()
+
+
+@router.post("/profile", response_class=PlainTextResponse)
+async def profile_worker(
+    mode: ProfileMode = ProfileMode.wall,
+    duration: float = Query(default=10, gt=0, le=PROFILE_MAX_DURATION),
+):
+    """Profile the API worker answering the request for ``duration`` seconds,
+    as collapsed stacks (see ``opaque_registry.profiling``)"""
+    if _profile_lock.locked():
+        raise ProfileAlreadyRunningError(pid=os.getpid())
+    async with _profile_lock:
+        with SamplingProfiler(mode=mode) as profiler:
+            await asyncio.sleep(duration)
+    return PlainTextResponse(
+        profiler.collapsed_stacks(), headers={"X-Profiled-Pid": str(os.getpid())}
+    )
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Header, Request, Response, status
+
+import opaque_registry.services.archive as archive_service
+from opaque_registry.api.errors.archives import ArchiveTooLargeError
+from opaque_registry.api.schemas.archive import Archive
+
+router = APIRouter(prefix="/archives", tags=["archives"])
+
+
+@router.post("/", response_model=Archive)
+async def upload_archive(
+    request: Request,
+    response: Response,
+    content_length: int | None = Header(default=None),
+):
+    """Store the request body as a package archive, package versions then
+    reference it by its ``sha256``. Uploading an archive already stored
+    returns it (200 instead of 201)"""
+    if content_length is not None and content_length > archive_service.ARCHIVE_MAX_SIZE:
+        raise ArchiveTooLargeError(max_size=archive_service.ARCHIVE_MAX_SIZE)
+    archive, created = await archive_service.store_archive(chunks=request.stream())
+    if created:
+        response.status_code = status.HTTP_201_CREATED
+    return archive
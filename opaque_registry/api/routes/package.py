@@ -1,15 +1,20 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
+import opaque_registry.services.dependents as dependents_service
 import opaque_registry.services.package as package_service
 from opaque_registry.api.errors.packages import PackageNotFoundError
+from opaque_registry.api.schemas.helpers.semver import SemVer
 from opaque_registry.api.schemas.package import (
     NewPackage,
     NewPackageVersion,
     Package,
+    PackageDependentList,
     PackageList,
     PackageVersion,
     PackageVersionList,
+    PutPackage,
+    PutPackageVersion,
 )
 from opaque_registry.database.connector import get_db_session
 
@@ -34,14 +39,53 @@ async def get_package_by_id(
 
 @router.get("/{package_id}/versions", response_model=PackageVersionList)
 async def get_package_versions(
-    package_id: str, db_session: AsyncSession = Depends(get_db_session)
+    package_id: str,
+    constraint: str | None = None,
+    include_prerelease: bool = True,
+    db_session: AsyncSession = Depends(get_db_session),
 ):
     package_versions = await package_service.get_package_versions(
-        db_session=db_session, package_id=package_id
+        db_session=db_session,
+        package_id=package_id,
+        constraint=constraint,
+        include_prerelease=include_prerelease,
     )
     return PackageVersionList(package_id=package_id, versions=package_versions)
 
 
+@router.get("/{package_id}/versions/latest", response_model=PackageVersion)
+async def get_latest_package_version(
+    package_id: str,
+    constraint: str | None = None,
+    include_prerelease: bool = False,
+    db_session: AsyncSession = Depends(get_db_session),
+):
+    return await package_service.get_latest_package_version(
+        db_session=db_session,
+        package_id=package_id,
+        constraint=constraint,
+        include_prerelease=include_prerelease,
+    )
+
+
+@router.get("/{package_id}/dependents", response_model=PackageDependentList)
+async def get_package_dependents(
+    package_id: str,
+    version: str | None = None,
+    transitive: bool = False,
+    db_session: AsyncSession = Depends(get_db_session),
+):
+    """Package versions depending on any version of the package, or on
+    ``version`` only, indirectly too when ``transitive`` is set"""
+    dependents = await dependents_service.get_package_dependents(
+        db_session=db_session,
+        package_id=package_id,
+        version=version,
+        transitive=transitive,
+    )
+    return PackageDependentList(package_id=package_id, dependents=dependents)
+
+
 @router.post("/", response_model=Package)
 async def create_package(
     package: NewPackage, db_session: AsyncSession = Depends(get_db_session)
@@ -58,3 +102,40 @@ async def create_package_version(
     return await package_service.create_package_version(
         db_session=db_session, package_id=package_id, package_version=package_version
     )
+
+
+@router.put("/{package_id}", response_model=Package)
+async def put_package(
+    package_id: str,
+    package: PutPackage,
+    response: Response,
+    db_session: AsyncSession = Depends(get_db_session),
+):
+    """Create the package, retrying with the same body returns the existing
+    package (200 instead of 201), a different body is a conflict"""
+    db_package, created = await package_service.put_package(
+        db_session=db_session, package=NewPackage(id=package_id, **package.dict())
+    )
+    if created:
+        response.status_code = status.HTTP_201_CREATED
+    return db_package
+
+
+@router.put("/{package_id}/versions/{version}", response_model=PackageVersion)
+async def put_package_version(
+    package_id: str,
+    version: SemVer,
+    package_version: PutPackageVersion,
+    response: Response,
+    db_session: AsyncSession = Depends(get_db_session),
+):
+    """Create the package version, retrying with the same body returns the
+    existing version (200 instead of 201), a different body is a conflict"""
+    db_package_version, created = await package_service.put_package_version(
+        db_session=db_session,
+        package_id=package_id,
+        package_version=NewPackageVersion(version=version, **package_version.dict()),
+    )
+    if created:
+        response.status_code = status.HTTP_201_CREATED
+    return db_package_version
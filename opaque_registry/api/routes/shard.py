@@ -0,0 +1,89 @@
+import hashlib
+
+from fastapi import APIRouter, Depends, Header, Query, Request, Response, status
+from fastapi.responses import RedirectResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import opaque_registry.services.shards as shards_service
+from opaque_registry.api.schemas.shard import ShardChange, ShardChangeFeed, ShardList
+from opaque_registry.database.connector import get_db_session
+from opaque_registry.existence_filter import PACKAGE_FILTER_KEY
+from opaque_registry.storage import get_artifact_url
+
+router = APIRouter(prefix="/shards", tags=["shards"])
+
+# an SSE comment is sent when nothing changed for this many seconds
+STREAM_KEEPALIVE_INTERVAL = 15
+
+
+@router.get("/", response_model=ShardList)
+async def get_shards(
+    response: Response,
+    if_none_match: str | None = Header(default=None),
+    db_session: AsyncSession = Depends(get_db_session),
+):
+    """Shards with their current generation, clients revalidate it with
+    ``If-None-Match`` to only download shards that changed"""
+    shards = await shards_service.get_all_shards(db_session=db_session)
+    shard_generations = ",".join(f"{shard.id}:{shard.generation}" for shard in shards)
+    etag = f'"{hashlib.sha256(shard_generations.encode()).hexdigest()[:32]}"'
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return ShardList(shards=shards)
+
+
+@router.get("/filter", response_class=RedirectResponse, status_code=307)
+async def get_package_filter():
+    """Bloom filter of the package ids and versions, published with the
+    index (see ``opaque_registry.existence_filter``)"""
+    return RedirectResponse(
+        get_artifact_url(PACKAGE_FILTER_KEY),
+        status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+    )
+
+
+@router.get("/changes", response_model=ShardChangeFeed)
+async def get_shard_changes(
+    since: int = Query(default=0, ge=0),
+    timeout: float = Query(default=0, ge=0, le=60),
+    limit: int = Query(default=100, ge=1, le=1000),
+):
+    """Shard generations published after the ``since`` cursor, waits up to
+    ``timeout`` seconds for one when there is none yet"""
+    shard_changes = await shards_service.wait_for_shard_changes(
+        since=since, limit=limit, timeout=timeout
+    )
+    return ShardChangeFeed(
+        cursor=shard_changes[-1]["cursor"] if shard_changes else since,
+        changes=shard_changes,
+    )
+
+
+@router.get("/changes/stream")
+async def stream_shard_changes(
+    request: Request,
+    since: int = Query(default=0, ge=0),
+    last_event_id: int | None = Header(default=None),
+):
+    """Server-sent events of the shard changes, reconnecting clients resume
+    from their ``Last-Event-ID``"""
+    cursor = last_event_id if last_event_id is not None else since
+
+    async def shard_change_events():
+        nonlocal cursor
+        while not await request.is_disconnected():
+            shard_changes = await shards_service.wait_for_shard_changes(
+                since=cursor, limit=100, timeout=STREAM_KEEPALIVE_INTERVAL
+            )
+            if not shard_changes:
+                yield ": keepalive\n\n"
+            for shard_change in shard_changes:
+                cursor = shard_change["cursor"]
+                yield (
+                    f"id: {cursor}\n"
+                    "event: shard_change\n"
+                    f"data: {ShardChange(**shard_change).json()}\n\n"
+                )
+
+    return StreamingResponse(shard_change_events(), media_type="text/event-stream")
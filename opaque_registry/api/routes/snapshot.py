@@ -0,0 +1,52 @@
+"""Package reads served from the in-memory registry snapshot
+
+Registered before the package router when ``OPAQUE_REGISTRY_SNAPSHOT`` is
+enabled, these routes take precedence over its ``GET`` routes.
+"""
+from fastapi import APIRouter, Response
+
+import opaque_registry.services.snapshot as snapshot_service
+from opaque_registry.api.schemas.package import (
+    Package,
+    PackageList,
+    PackageVersion,
+    PackageVersionList,
+)
+
+router = APIRouter(prefix="/packages", tags=["packages"])
+
+
+@router.get("/", response_model=PackageList)
+async def get_all_packages():
+    return Response(
+        content=snapshot_service.get_snapshot().packages_json(),
+        media_type="application/json",
+    )
+
+
+@router.get("/{package_id}", response_model=Package)
+async def get_package_by_id(package_id: str):
+    return snapshot_service.get_package_by_id(package_id=package_id)
+
+
+@router.get("/{package_id}/versions", response_model=PackageVersionList)
+async def get_package_versions(
+    package_id: str, constraint: str | None = None, include_prerelease: bool = True
+):
+    package_versions = snapshot_service.get_package_versions(
+        package_id=package_id,
+        constraint=constraint,
+        include_prerelease=include_prerelease,
+    )
+    return PackageVersionList(package_id=package_id, versions=package_versions)
+
+
+@router.get("/{package_id}/versions/latest", response_model=PackageVersion)
+async def get_latest_package_version(
+    package_id: str, constraint: str | None = None, include_prerelease: bool = False
+):
+    return snapshot_service.get_latest_package_version(
+        package_id=package_id,
+        constraint=constraint,
+        include_prerelease=include_prerelease,
+    )
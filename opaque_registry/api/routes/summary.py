@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import opaque_registry.services.summary as summary_service
+from opaque_registry.api.schemas.package import PackageSummaryList
+from opaque_registry.database.connector import get_db_session
+from opaque_registry.services.summary import PackageSummarySort
+
+router = APIRouter(prefix="/summaries", tags=["summaries"])
+
+
+@router.get("/", response_model=PackageSummaryList)
+async def get_package_summaries(
+    sort: PackageSummarySort = PackageSummarySort.recent,
+    limit: int = Query(default=100, ge=1, le=1000),
+    offset: int = Query(default=0, ge=0),
+    db_session: AsyncSession = Depends(get_db_session),
+):
+    summaries = await summary_service.get_package_summaries(
+        db_session=db_session, sort=sort, limit=limit, offset=offset
+    )
+    return PackageSummaryList(summaries=summaries)
@@ -0,0 +1,9 @@
+from pydantic import BaseModel, constr
+
+Sha256 = constr(regex=r"^[0-9a-f]{64}$")
+
+
+class Archive(BaseModel):
+    sha256: Sha256
+    size: int
+    url: str
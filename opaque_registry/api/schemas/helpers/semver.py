@@ -1,3 +1,6 @@
+import re
+from typing import NamedTuple
+
 from semver import Version
 
 
@@ -21,3 +24,106 @@ class SemVer:
                 "21.3.15-beta+12345",
             ]
         )
+
+
+class VersionComparator(NamedTuple):
+    operator: str
+    major: int
+    minor: int
+    patch: int
+    prerelease: str | None = None
+
+
+_WILDCARDS = {"x", "X", "*"}
+_COMPARATOR_RE = re.compile(r"^(\^|~|>=|<=|>|<|==|=)?\s*(.+)$")
+_PARTIAL_VERSION_RE = re.compile(
+    r"^v?(\d+|[xX*])(?:\.(\d+|[xX*]))?(?:\.(\d+|[xX*]))?"
+    r"(?:-([0-9A-Za-z.-]+))?(?:\+[0-9A-Za-z.-]+)?$"
+)
+
+
+def _parse_partial_version(
+    version: str,
+) -> tuple[list[int], str | None]:
+    match = _PARTIAL_VERSION_RE.match(version)
+    if match is None:
+        raise ValueError(f"invalid version '{version}'")
+    parts = []
+    for part in match.group(1, 2, 3):
+        if part is None or part in _WILDCARDS:
+            break
+        parts.append(int(part))
+    prerelease = match.group(4)
+    if prerelease is not None and len(parts) != 3:
+        raise ValueError(f"prerelease requires a full version in '{version}'")
+    return parts, prerelease
+
+
+def _bump(parts: list[int], position: int) -> tuple[int, int, int]:
+    bumped = parts[:position] + [parts[position] + 1]
+    return tuple(bumped + [0] * (3 - len(bumped)))
+
+
+def _pad(parts: list[int]) -> tuple[int, int, int]:
+    return tuple(parts + [0] * (3 - len(parts)))
+
+
+def _expand_comparator(operator: str, version: str) -> list[VersionComparator]:
+    parts, prerelease = _parse_partial_version(version)
+    if not parts:
+        # "*" matches everything, except for exclusive operators
+        if operator in ("<", ">"):
+            raise ValueError(f"'{operator}{version}' can never match")
+        return []
+    lower = _pad(parts)
+    # exclusive upper bound of the range covered by a partial version
+    upper = _bump(parts, len(parts) - 1)
+    full = len(parts) == 3
+
+    if operator == "^":
+        first_non_zero = next(
+            (index for index, part in enumerate(parts) if part != 0), len(parts) - 1
+        )
+        return [
+            VersionComparator(">=", *lower),
+            VersionComparator("<", *_bump(parts, first_non_zero)),
+        ]
+    if operator == "~":
+        return [
+            VersionComparator(">=", *lower),
+            VersionComparator("<", *_bump(parts, min(len(parts) - 1, 1))),
+        ]
+    if operator == ">=":
+        return [VersionComparator(">=", *lower)]
+    if operator == ">":
+        return [
+            VersionComparator(">", *lower) if full else VersionComparator(">=", *upper)
+        ]
+    if operator == "<":
+        return [VersionComparator("<", *lower)]
+    if operator == "<=":
+        return [
+            VersionComparator("<=", *lower) if full else VersionComparator("<", *upper)
+        ]
+    if full:
+        return [VersionComparator("==", *lower, prerelease=prerelease)]
+    return [VersionComparator(">=", *lower), VersionComparator("<", *upper)]
+
+
+def parse_version_constraint(constraint: str) -> list[VersionComparator]:
+    """Parse a version constraint (``^2.1``, ``~1.4``, ``>=1.0.0,<2``, ``2.x``...)
+    into a list of comparators that must all match.
+
+    :raises ValueError: if the constraint is malformed
+    """
+    comparators = []
+    for raw_comparator in re.split(r"[,\s]+(?=[\^~<>=vxX*\d])", constraint.strip()):
+        raw_comparator = raw_comparator.strip(" ,")
+        if not raw_comparator:
+            continue
+        match = _COMPARATOR_RE.match(raw_comparator)
+        if match is None:
+            raise ValueError(f"invalid comparator '{raw_comparator}'")
+        operator, version = match.group(1) or "==", match.group(2).strip()
+        comparators += _expand_comparator(operator, version)
+    return comparators
@@ -1,5 +1,8 @@
-from pydantic import BaseModel
+from datetime import datetime
 
+from pydantic import BaseModel, root_validator
+
+from opaque_registry.api.schemas.archive import Sha256
 from opaque_registry.api.schemas.helpers.semver import SemVer
 
 
@@ -20,6 +23,12 @@ class NewPackage(BaseModel):
     meta: bool = False
 
 
+class PutPackage(BaseModel):
+    description: str | None = None
+    tags: list[str] | None = None
+    meta: bool = False
+
+
 class PackageVersion(BaseModel):
     version: SemVer
     url: str
@@ -33,9 +42,26 @@ class Dependency(BaseModel):
     version: SemVer
 
 
-class NewPackageVersion(BaseModel):
+class ArchiveLocation(BaseModel):
+    """``url`` of an archive hosted elsewhere or ``archive``, the sha256 of an
+    archive uploaded to the registry, which fills ``url``"""
+
+    url: str | None = None
+    archive: Sha256 | None = None
+
+    @root_validator(skip_on_failure=True)
+    def check_single_location(cls, values):
+        if (values["url"] is None) == (values["archive"] is None):
+            raise ValueError("either url or archive is required")
+        return values
+
+
+class NewPackageVersion(ArchiveLocation):
     version: SemVer
-    url: str
+    dependencies: list[Dependency] = []
+
+
+class PutPackageVersion(ArchiveLocation):
     dependencies: list[Dependency] = []
 
 
@@ -46,3 +72,37 @@ class PackageVersionList(BaseModel):
 
 class PackageList(BaseModel):
     packages: list[Package]
+
+
+class PackageDependent(BaseModel):
+    package_id: str
+    version: str
+    dependency_version: str
+    # 1 for direct dependents
+    depth: int
+
+    class Config:
+        orm_mode = True
+
+
+class PackageDependentList(BaseModel):
+    package_id: str
+    dependents: list[PackageDependent]
+
+
+class PackageSummary(BaseModel):
+    package_id: str
+    description: str | None = None
+    latest_version: str | None = None
+    version_count: int
+    published_version_count: int
+    dependent_count: int
+    last_version_at: datetime | None = None
+    last_published_at: datetime | None = None
+
+    class Config:
+        orm_mode = True
+
+
+class PackageSummaryList(BaseModel):
+    summaries: list[PackageSummary]
@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class Shard(BaseModel):
+    id: int
+    generation: int
+    location: str
+
+    class Config:
+        orm_mode = True
+
+
+class ShardList(BaseModel):
+    shards: list[Shard]
+
+
+class ChangedPackageVersion(BaseModel):
+    package_id: str
+    version: str
+    url: str
+
+
+class ShardChange(BaseModel):
+    cursor: int
+    shard_id: int
+    generation: int
+    location: str
+    published_at: datetime
+    versions: list[ChangedPackageVersion]
+
+
+class ShardChangeFeed(BaseModel):
+    # cursor to send as ``since`` on the next request
+    cursor: int
+    changes: list[ShardChange]
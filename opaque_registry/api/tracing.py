@@ -0,0 +1,48 @@
+from opentelemetry import context, propagate, trace
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from opaque_registry.tracing import tracer
+
+
+class TracingMiddleware:
+    """Trace every request in a server span named after its route template,
+    continuing the trace of the caller when it sends a ``traceparent`` header"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        carrier = {
+            name.decode("latin-1"): value.decode("latin-1")
+            for name, value in scope["headers"]
+        }
+        method = scope["method"]
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    span.set_status(trace.StatusCode.ERROR)
+            await send(message)
+
+        token = context.attach(propagate.extract(carrier))
+        try:
+            with tracer.start_as_current_span(
+                f"{method} {scope['path']}",
+                kind=trace.SpanKind.SERVER,
+                attributes={"http.method": method, "http.target": scope["path"]},
+            ) as span:
+                try:
+                    await self.app(scope, receive, send_wrapper)
+                finally:
+                    # the router stores the matched route in the scope
+                    route = scope.get("route")
+                    if route is not None:
+                        span.update_name(f"{method} {route.path}")
+                        span.set_attribute("http.route", route.path)
+        finally:
+            context.detach(token)
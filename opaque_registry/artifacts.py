@@ -0,0 +1,29 @@
+"""Binary format of the shard and index artifacts, shared by the registry
+and its clients
+
+Artifacts are msgpack encoded ``{package_id: [{"version", "url",
+"dependencies"}, ...]}`` maps, ``dependencies`` being a list of ``[package_id,
+version]`` pairs. The key is written even when the list is empty: versions of
+artifacts published before the dependency lists have no such key, consumers
+reading ``version`` and ``url`` only read both.
+"""
+import msgpack
+
+
+def make_version_entry(
+    version: str, url: str, dependencies: list[list[str]] | None
+) -> dict:
+    return {"version": version, "url": url, "dependencies": dependencies or []}
+
+
+def pack_artifact_header(packer: msgpack.Packer, package_count: int) -> bytes:
+    """Header of an artifact whose packages map is packed entry by entry"""
+    return packer.pack_map_header(package_count)
+
+
+def pack_artifact(packages: dict[str, list[dict]]) -> bytes:
+    return msgpack.packb(packages)
+
+
+def unpack_artifact(data) -> dict[str, list[dict]]:
+    return msgpack.unpackb(data)
@@ -0,0 +1,93 @@
+"""Lightweight task dispatch for the API process
+
+Tasks are sent by name so the API never imports their implementation (and
+boto3, msgpack or the worker database setup along with it). Task names must
+match the ones declared in ``opaque_registry.async_tasks.shards.tasks``.
+
+Tasks are routed to one of three queues, each consumed by its own workers
+(see ``opaque_registry.worker``) so a publication never waits behind batch
+work:
+
+- ``shards``: shards republished after a package version is created
+- ``index``: whole index builds
+- ``maintenance``: bulk work such as ``rebuild-shards``
+
+A task identical to one still waiting in its queue is not sent again.
+"""
+import json
+import os
+from functools import cache
+
+from opaque_registry.tracing import inject_trace_context
+
+CREATE_SHARD_TASK = "opaque_registry.async_tasks.shards.tasks.create_shard_task"
+CREATE_WHOLE_INDEX_TASK = (
+    "opaque_registry.async_tasks.shards.tasks.create_whole_index_task"
+)
+
+SHARDS_QUEUE = "shards"
+INDEX_QUEUE = "index"
+MAINTENANCE_QUEUE = "maintenance"
+TASK_QUEUES = (SHARDS_QUEUE, INDEX_QUEUE, MAINTENANCE_QUEUE)
+
+TASK_ROUTES = {
+    CREATE_SHARD_TASK: {"queue": SHARDS_QUEUE},
+    CREATE_WHOLE_INDEX_TASK: {"queue": INDEX_QUEUE},
+}
+
+# a lost message only blocks identical tasks until the marker expires
+PENDING_TASK_TTL = int(os.getenv("OPAQUE_REGISTRY_PENDING_TASK_TTL", "600"))
+
+
+@cache
+def _get_celery_app():
+    # imported on first dispatch to keep celery out of API startup
+    from opaque_registry.celery_app import celery_app
+
+    return celery_app
+
+
+@cache
+def get_redis_client():
+    import redis
+
+    return redis.from_url(url=os.getenv("CELERY_BROKER_URL"))
+
+
+def get_pending_task_key(task_name: str, kwargs: dict) -> str:
+    return f"pending_task:{task_name}:{json.dumps(kwargs, sort_keys=True)}"
+
+
+def clear_pending_task(task_name: str, kwargs: dict):
+    """Called when a task starts, identical tasks sent from now on are queued"""
+    get_redis_client().delete(get_pending_task_key(task_name, kwargs))
+
+
+def send_task(
+    task_name: str,
+    trace_context: dict[str, str] | None = None,
+    queue: str | None = None,
+    **kwargs,
+):
+    """Send a task to its queue, unless an identical one is still pending
+
+    :returns: the result of the sent task, None if it was not sent
+    """
+    pending_task_key = get_pending_task_key(task_name, kwargs)
+    if not get_redis_client().set(pending_task_key, 1, nx=True, ex=PENDING_TASK_TTL):
+        return None
+    options = {"queue": queue} if queue is not None else {}
+    try:
+        # the trace context travels in the message headers
+        return _get_celery_app().send_task(
+            task_name,
+            kwargs=kwargs,
+            headers=(
+                trace_context if trace_context is not None else inject_trace_context()
+            ),
+            **options,
+        )
+    except BaseException:
+        # the task was not queued, a retry must send it
+        get_redis_client().delete(pending_task_key)
+        raise
@@ -0,0 +1,107 @@
+"""Prometheus metrics of the shard and index generation pipeline
+
+The exporter is started with the Celery worker on
+``OPAQUE_REGISTRY_WORKER_METRICS_PORT`` (``0`` disables it). With the
+default prefork pool, tasks run in child processes: set
+``PROMETHEUS_MULTIPROC_DIR`` to an empty directory so their metrics are
+aggregated by the exporter.
+
+The exporter also reports the depth of every task queue, read from the
+broker when scraped.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+import redis
+from celery.signals import worker_init, worker_process_shutdown
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Histogram,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from opaque_registry.async_tasks.dispatch import TASK_QUEUES, get_redis_client
+from opaque_registry.tracing import tracer
+
+WORKER_METRICS_PORT = int(os.getenv("OPAQUE_REGISTRY_WORKER_METRICS_PORT", "9808"))
+
+TASK_STAGE_DURATION = Histogram(
+    "opaque_registry_task_stage_duration_seconds",
+    "Duration of each stage of the shard and index generation tasks",
+    ["task", "stage"],
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+TASK_ROWS = Histogram(
+    "opaque_registry_task_rows",
+    "Package versions packed in a shard or index artifact",
+    ["task"],
+    buckets=(1, 10, 100, 1_000, 10_000, 100_000, 1_000_000),
+)
+TASK_ARTIFACT_BYTES = Histogram(
+    "opaque_registry_task_artifact_bytes",
+    "Size of the uploaded shard or index artifacts",
+    ["task"],
+    buckets=(1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000, 1e9),
+)
+PUBLISH_LAG = Histogram(
+    "opaque_registry_publish_lag_seconds",
+    "Delay between a package version creation and its publication in a shard",
+    buckets=(1, 2, 5, 10, 30, 60, 120, 300, 600, 1800, 3600),
+)
+
+
+class QueueDepthCollector(Collector):
+    def collect(self):
+        queue_depth = GaugeMetricFamily(
+            "opaque_registry_task_queue_depth",
+            "Tasks waiting in each queue",
+            labels=["queue"],
+        )
+        try:
+            # the redis transport keeps the messages of a queue in a list
+            with get_redis_client().pipeline(transaction=False) as pipeline:
+                for queue in TASK_QUEUES:
+                    pipeline.llen(queue)
+                depths = pipeline.execute()
+        except redis.RedisError:
+            return
+        for queue, depth in zip(TASK_QUEUES, depths):
+            queue_depth.add_metric([queue], depth)
+        yield queue_depth
+
+
+@contextmanager
+def stage_timer(task: str, stage: str):
+    """Time a stage of a task, also traced as a child span of the task"""
+    start = time.perf_counter()
+    try:
+        with tracer.start_as_current_span(f"{task}.{stage}"):
+            yield
+    finally:
+        TASK_STAGE_DURATION.labels(task=task, stage=stage).observe(
+            time.perf_counter() - start
+        )
+
+
+@worker_init.connect
+def start_metrics_exporter(**kwargs):
+    if WORKER_METRICS_PORT == 0:
+        return
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    registry.register(QueueDepthCollector())
+    start_http_server(WORKER_METRICS_PORT, registry=registry)
+
+
+@worker_process_shutdown.connect
+def mark_worker_process_dead(pid: int | None = None, **kwargs):
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(pid or os.getpid())
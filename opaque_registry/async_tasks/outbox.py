@@ -0,0 +1,118 @@
+"""Transactional outbox for Celery tasks
+
+Request handlers only insert :class:`TaskOutbox` rows in their own
+transaction, tasks therefore never run against uncommitted data and are not
+lost if the broker is unavailable. The dispatcher, running in the API
+workers, drains committed rows in batches and sends them to the broker.
+"""
+import asyncio
+import json
+import logging
+import os
+from collections.abc import Awaitable, Callable
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import opaque_registry.database.models as db_models
+from opaque_registry.async_tasks.dispatch import send_task
+from opaque_registry.database.connector import create_async_db_sessionmaker
+from opaque_registry.tracing import attached_trace_context, inject_trace_context, tracer
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_DISPATCHER_ENABLED = os.getenv("OPAQUE_REGISTRY_OUTBOX_DISPATCHER", "1") == "1"
+OUTBOX_POLL_INTERVAL = float(os.getenv("OPAQUE_REGISTRY_OUTBOX_POLL_INTERVAL", "0.5"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OPAQUE_REGISTRY_OUTBOX_BATCH_SIZE", "100"))
+
+# coroutine sending a task, called with the task name, trace_context and the
+# task kwargs
+TaskSender = Callable[..., Awaitable[None]]
+
+
+async def enqueue_task(db_session: AsyncSession, task_name: str, **kwargs):
+    db_session.add(
+        db_models.TaskOutbox(
+            task_name=task_name, kwargs=kwargs, trace_context=inject_trace_context()
+        )
+    )
+
+
+async def send_to_broker(task_name: str, trace_context: dict[str, str], **kwargs):
+    # broker clients are blocking
+    await asyncio.to_thread(send_task, task_name, trace_context=trace_context, **kwargs)
+
+
+async def drain_outbox(
+    db_session: AsyncSession,
+    batch_size: int = OUTBOX_BATCH_SIZE,
+    send: TaskSender = send_to_broker,
+) -> int:
+    """Send a batch of pending tasks, identical tasks are only sent once
+
+    Must run inside a transaction, rows are deleted once sent and locked
+    meanwhile so several dispatchers can drain the outbox concurrently.
+
+    :returns: the amount of outbox rows drained
+    """
+    outbox_rows = (
+        (
+            await db_session.execute(
+                select(db_models.TaskOutbox)
+                .order_by(db_models.TaskOutbox.id)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            )
+        )
+        .scalars()
+        .all()
+    )
+    if not outbox_rows:
+        return 0
+    unique_tasks = {}
+    for outbox_row in outbox_rows:
+        task_key = (outbox_row.task_name, json.dumps(outbox_row.kwargs, sort_keys=True))
+        unique_tasks.setdefault(task_key, outbox_row)
+    for outbox_row in unique_tasks.values():
+        # continues the trace of the request which queued the task
+        with attached_trace_context(outbox_row.trace_context):
+            with tracer.start_as_current_span(
+                "outbox.send", attributes={"celery.task_name": outbox_row.task_name}
+            ):
+                await send(
+                    outbox_row.task_name,
+                    trace_context=inject_trace_context(),
+                    **outbox_row.kwargs,
+                )
+    await db_session.execute(
+        delete(db_models.TaskOutbox).where(
+            db_models.TaskOutbox.id.in_([outbox_row.id for outbox_row in outbox_rows])
+        )
+    )
+    logger.info(
+        f"[Outbox] sent {len(unique_tasks)} tasks from {len(outbox_rows)} entries"
+    )
+    return len(outbox_rows)
+
+
+async def run_outbox_dispatcher(
+    poll_interval: float = OUTBOX_POLL_INTERVAL,
+    batch_size: int = OUTBOX_BATCH_SIZE,
+    send: TaskSender = send_to_broker,
+):
+    async_sessionmaker = create_async_db_sessionmaker()
+    while True:
+        try:
+            async with async_sessionmaker() as session:
+                async with session.begin():
+                    drained = await drain_outbox(
+                        db_session=session, batch_size=batch_size, send=send
+                    )
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("[Outbox] failed to drain outbox, retrying")
+            drained = 0
+        # keep draining without waiting while there is a backlog
+        if drained < batch_size:
+            await asyncio.sleep(poll_interval)
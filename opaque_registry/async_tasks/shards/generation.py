@@ -0,0 +1,307 @@
+"""Generation of the shard and index artifacts
+
+Shared by the Celery tasks and the embedded publisher, callers are
+responsible for not generating the same artifact concurrently.
+"""
+import itertools
+import logging
+import os
+from datetime import datetime, timezone
+from operator import itemgetter
+
+import msgpack
+from sqlalchemy import distinct, func, select, update
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+import opaque_registry.database.models as db_models
+from opaque_registry.artifacts import (
+    make_version_entry,
+    pack_artifact,
+    pack_artifact_header,
+)
+from opaque_registry.async_tasks.metrics import (
+    PUBLISH_LAG,
+    TASK_ARTIFACT_BYTES,
+    TASK_ROWS,
+    stage_timer,
+)
+from opaque_registry.database.connector import (
+    create_sync_db_sessionmaker,
+    init_sync_db_engine,
+)
+from opaque_registry.existence_filter import (
+    PACKAGE_FILTER_KEY,
+    BloomFilter,
+    pack_package_filter,
+    package_key,
+    package_version_key,
+)
+from opaque_registry.services.shards import (
+    SHARD_CHANGES_CHANNEL,
+    SHARD_CHANGES_LOCK_KEY,
+)
+from opaque_registry.storage import open_artifact_upload, upload_artifact
+
+logger = logging.getLogger(__name__)
+
+SHARDS_PREFIX = "shards"
+INDEX_FETCH_BATCH_SIZE = int(
+    os.getenv("OPAQUE_REGISTRY_INDEX_FETCH_BATCH_SIZE", "5000")
+)
+
+
+def select_version_dependencies():
+    """``[[package_id, version], ...]`` of the selected package version, null
+    when it has no dependencies (read through the primary key)"""
+    dependency = db_models.PackageVersionDependency
+    return (
+        select(
+            func.json_agg(
+                aggregate_order_by(
+                    func.json_build_array(
+                        dependency.dependency, dependency.dependency_version
+                    ),
+                    dependency.dependency,
+                    dependency.dependency_version,
+                )
+            )
+        )
+        .where(
+            dependency.package_id == db_models.PackageVersion.package_id,
+            dependency.version == db_models.PackageVersion.version,
+        )
+        .scalar_subquery()
+    )
+
+
+def generate_whole_index() -> str:
+    """Build and upload the index of every package, then the package filter
+
+    :returns: the URL of the index
+    """
+    init_sync_db_engine()
+    async_sessionmaker = create_sync_db_sessionmaker()
+    rows_count = 0
+    stream_timer = stage_timer(task="index", stage="stream")
+    with stream_timer, async_sessionmaker() as session:
+        # the counts, the filter and the versions are read from one snapshot
+        session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        # use db to retrieve time
+        db_time = session.execute(select(func.now())).scalar_one_or_none()
+        package_count = session.scalar(
+            select(func.count(distinct(db_models.PackageVersion.package_id)))
+            .join(db_models.Package)
+            .where(db_models.Package.meta == False)
+        )
+        package_filter = BloomFilter.for_capacity(
+            session.scalar(select(func.count()).select_from(db_models.Package))
+            + session.scalar(
+                select(func.count())
+                .select_from(db_models.PackageVersion)
+                .join(db_models.Package)
+                .where(db_models.Package.meta == False)
+            )
+        )
+        shard_generations = dict(
+            session.execute(
+                select(db_models.Shard.id, db_models.Shard.generation)
+            ).all()
+        )
+        # meta packages too, the filter answers package lookups
+        for package_id in session.scalars(
+            select(db_models.Package.id).execution_options(
+                yield_per=INDEX_FETCH_BATCH_SIZE
+            )
+        ):
+            package_filter.add(package_key(package_id))
+        db_package_versions = session.execute(
+            select(
+                db_models.PackageVersion.package_id,
+                db_models.PackageVersion.version,
+                db_models.PackageVersion.url,
+                select_version_dependencies(),
+            )
+            .join(db_models.Package)
+            .where(db_models.Package.meta == False)
+            # follows ix_package_version_semver, rows stream without a sort
+            .order_by(
+                db_models.PackageVersion.package_id,
+                db_models.PackageVersion.version_major,
+                db_models.PackageVersion.version_minor,
+                db_models.PackageVersion.version_patch,
+            )
+            .execution_options(yield_per=INDEX_FETCH_BATCH_SIZE)
+        )
+        logger.info(f"[IndexGen Task] Streaming binary index")
+        # same bytes as packing the whole {package_id: versions} artifact
+        # at once, only the versions of one package are held in memory
+        packer = msgpack.Packer()
+        with open_artifact_upload(key=f"index_{db_time}") as index_upload:
+            index_upload.write(pack_artifact_header(packer, package_count))
+            for package_id, package_versions in itertools.groupby(
+                db_package_versions, key=itemgetter(0)
+            ):
+                versions = [
+                    make_version_entry(version, url, dependencies)
+                    for _, version, url, dependencies in package_versions
+                ]
+                index_upload.write(packer.pack(package_id) + packer.pack(versions))
+                for version_entry in versions:
+                    package_filter.add(
+                        package_version_key(package_id, version_entry["version"])
+                    )
+                rows_count += len(versions)
+    TASK_ROWS.labels(task="index").observe(rows_count)
+    TASK_ARTIFACT_BYTES.labels(task="index").observe(index_upload.size)
+    logger.info(f"[IndexGen Task] Index uploaded to {index_upload.url}")
+    with stage_timer(task="index", stage="filter_upload"):
+        package_filter_url = upload_artifact(
+            data=pack_package_filter(package_filter, shard_generations),
+            key=PACKAGE_FILTER_KEY,
+        )
+    logger.info(f"[IndexGen Task] Package filter uploaded to {package_filter_url}")
+    return index_upload.url
+
+
+def generate_shard(shard_id: int) -> str:
+    """Publish the pending versions of a shard in a new generation
+
+    :returns: the URL of the shard generation
+    """
+    logger.info(f"[Shard {shard_id}] starting generation")
+    init_sync_db_engine()
+    async_sessionmaker = create_sync_db_sessionmaker()
+    shard_packages = {}
+    # creation dates of the versions published by this generation
+    unpublished_created_at = []
+    rows_count = 0
+    with stage_timer(task="shard", stage="db_fetch"), async_sessionmaker() as session:
+        logger.info(f"[Shard {shard_id}] retrieving infos")
+        shard_infos = session.execute(
+            select(db_models.Shard).filter_by(id=shard_id)
+        ).scalar_one_or_none()
+        logger.info(f"[Shard {shard_id}] stamping pending package versions")
+        # versions created after this point are left for the next generation
+        session.execute(
+            update(db_models.PackageVersion)
+            .where(
+                db_models.PackageVersion.shard_id == shard_id,
+                db_models.PackageVersion.package_id == db_models.Package.id,
+                db_models.Package.shard_id == shard_id,
+                db_models.Package.meta == False,
+                db_models.PackageVersion.published_generation.is_(None),
+            )
+            .values(published_generation=shard_infos.generation)
+            .execution_options(synchronize_session=False)
+        )
+        logger.info(f"[Shard {shard_id}] retrieving packages")
+        db_package_versions = session.execute(
+            select(db_models.PackageVersion, select_version_dependencies())
+            .join(db_models.Package)
+            .where(
+                # both filters, a partitioned table only scans the shard
+                db_models.PackageVersion.shard_id == shard_id,
+                db_models.Package.shard_id == shard_id,
+                db_models.Package.meta == False,
+                db_models.PackageVersion.published_generation.is_not(None),
+            )
+            .order_by(db_models.PackageVersion.package_id)
+        )
+        for package_version, dependencies in db_package_versions:
+            shard_packages.setdefault(package_version.package_id, []).append(
+                make_version_entry(
+                    package_version.version, package_version.url, dependencies
+                )
+            )
+            if not package_version.published:
+                unpublished_created_at.append(package_version.created_at)
+            rows_count += 1
+        session.commit()
+
+    logger.info(f"[Shard {shard_id}] building binary shard generation")
+    with stage_timer(task="shard", stage="encode"):
+        msgpack_bytes = pack_artifact(shard_packages)
+    TASK_ROWS.labels(task="shard").observe(rows_count)
+    TASK_ARTIFACT_BYTES.labels(task="shard").observe(len(msgpack_bytes))
+    logger.info(f"[Shard {shard_id}] uploading generation {shard_infos.generation}")
+    with stage_timer(task="shard", stage="upload"):
+        shard_generation_url = upload_artifact(
+            data=msgpack_bytes,
+            key=f"{SHARDS_PREFIX}/{shard_id}_{shard_infos.generation}",
+        )
+    with stage_timer(task="shard", stage="publish"), async_sessionmaker() as session:
+        logger.info(f"[Shard {shard_id}] updating generation count")
+        session.execute(
+            update(db_models.Shard)
+            .where(db_models.Shard.id == shard_id)
+            .values(
+                generation=shard_infos.generation + 1, location=shard_generation_url
+            )
+        )
+        logger.info(f"[Shard {shard_id}] updating packages published field")
+        publishable_versions = (
+            # versions of meta packages are never stamped
+            db_models.PackageVersion.shard_id == shard_id,
+            db_models.PackageVersion.published_generation <= shard_infos.generation,
+            db_models.PackageVersion.published == False,
+        )
+        # summaries are locked in the order the API locks them, see
+        # services.summary.record_new_package_version
+        session.execute(
+            select(db_models.PackageSummary.package_id)
+            .where(
+                db_models.PackageSummary.package_id.in_(
+                    select(db_models.PackageVersion.package_id).where(
+                        *publishable_versions
+                    )
+                )
+            )
+            .order_by(db_models.PackageSummary.package_id)
+            .with_for_update()
+        )
+        published_versions = (
+            update(db_models.PackageVersion)
+            .where(*publishable_versions)
+            .values(published=True)
+            .returning(db_models.PackageVersion.package_id)
+            .cte("published_versions")
+        )
+        published_counts = (
+            select(
+                published_versions.c.package_id,
+                func.count().label("published_count"),
+            )
+            .group_by(published_versions.c.package_id)
+            .subquery()
+        )
+        # publishing and summaries update run as a single statement
+        session.execute(
+            update(db_models.PackageSummary)
+            .where(db_models.PackageSummary.package_id == published_counts.c.package_id)
+            .values(
+                published_version_count=db_models.PackageSummary.published_version_count
+                + published_counts.c.published_count,
+                last_published_at=func.now(),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        logger.info(f"[Shard {shard_id}] recording shard change")
+        # a change committed before a smaller id would be skipped by the feed
+        # readers past it, the publications are serialized from here to commit
+        session.execute(select(func.pg_advisory_xact_lock(SHARD_CHANGES_LOCK_KEY)))
+        shard_change = db_models.ShardChange(
+            shard_id=shard_id,
+            generation=shard_infos.generation,
+            location=shard_generation_url,
+        )
+        session.add(shard_change)
+        session.flush()
+        # delivered to the change feed listeners on commit
+        session.execute(
+            select(func.pg_notify(SHARD_CHANGES_CHANNEL, str(shard_change.id)))
+        )
+        session.commit()
+    published_at = datetime.now(timezone.utc)
+    for created_at in unpublished_created_at:
+        PUBLISH_LAG.observe((published_at - created_at).total_seconds())
+    return shard_generation_url
@@ -0,0 +1,46 @@
+"""Continue the trace of the request which queued a task in the worker"""
+import os
+
+from celery.signals import task_postrun, task_prerun
+from opentelemetry import context, propagate, trace
+
+from opaque_registry.tracing import init_tracing, tracer
+
+# task id -> (span, context token) of the running tasks
+_task_spans = {}
+_tracing_pid = None
+
+
+@task_prerun.connect
+def start_task_span(task_id: str, task, **kwargs):
+    global _tracing_pid
+    # prefork children must open their own exporter
+    if _tracing_pid != os.getpid():
+        _tracing_pid = os.getpid()
+        init_tracing(service_name="opaque-registry-worker")
+    carrier = {
+        field: getattr(task.request, field)
+        for field in propagate.get_global_textmap().fields
+        if getattr(task.request, field, None) is not None
+    }
+    span = tracer.start_span(
+        task.name.rsplit(".", 1)[-1],
+        context=propagate.extract(carrier),
+        kind=trace.SpanKind.CONSUMER,
+        attributes={"celery.task_id": task_id, "celery.task_name": task.name},
+    )
+    token = context.attach(trace.set_span_in_context(span))
+    _task_spans[task_id] = (span, token)
+
+
+@task_postrun.connect
+def end_task_span(task_id: str, state: str | None = None, **kwargs):
+    span, token = _task_spans.pop(task_id, (None, None))
+    if span is None:
+        return
+    if state is not None:
+        span.set_attribute("celery.state", state)
+        if state == "FAILURE":
+            span.set_status(trace.StatusCode.ERROR)
+    context.detach(token)
+    span.end()
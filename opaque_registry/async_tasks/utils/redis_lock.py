@@ -117,26 +117,30 @@ class BaseLock(object):
 
         :param bool blocking: acquire a lock in a blocking or non-blocking
                               fashion. Defaults to True.
+        :param float timeout: maximum time to wait for the lock when blocking,
+                              waits forever if `None`.
         :returns: if the lock was successfully acquired or not
         :rtype: bool
+        :raises LockTimeoutException: if the timeout elapsed
         """
 
         if blocking is True:
             if timeout is None:
                 while self._acquire() is not True:
                     time.sleep(retry_interval)
-            else:
-                while timeout >= 0:
-                    if self._acquire() is not True:
-                        timeout -= retry_interval
-                        if timeout > 0:
-                            time.sleep(retry_interval)
-                    else:
-                        return True
+                return True
+            remaining = timeout
+            while remaining >= 0:
+                if self._acquire() is not True:
+                    remaining -= retry_interval
+                    if remaining > 0:
+                        time.sleep(retry_interval)
+                else:
+                    return True
             raise LockTimeoutException(
                 "Timeout elapsed after %s seconds "
                 "while trying to acquiring "
-                "lock." % self.timeout
+                "lock." % timeout
             )
         else:
             return self._acquire()
@@ -1,5 +1,27 @@
 from celery import Celery
+from celery.signals import task_prerun
+from kombu import Exchange, Queue
+
+from opaque_registry.async_tasks.dispatch import (
+    TASK_QUEUES,
+    TASK_ROUTES,
+    clear_pending_task,
+)
 
 celery_app = Celery("opaque_registry")
+celery_app.conf.update(
+    task_queues=[
+        Queue(queue, Exchange(queue), routing_key=queue) for queue in TASK_QUEUES
+    ],
+    task_routes=TASK_ROUTES,
+    task_default_queue=TASK_QUEUES[0],
+    # workers only reserve the next task, a long one never holds others back
+    worker_prefetch_multiplier=1,
+)
 
 celery_app.autodiscover_tasks(["opaque_registry.async_tasks.shards"])
+
+
+@task_prerun.connect
+def clear_pending_task_marker(task, kwargs: dict | None = None, **extra):
+    clear_pending_task(task.name, kwargs or {})
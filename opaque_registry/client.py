@@ -0,0 +1,275 @@
+"""Client of the registry shards
+
+Package versions are read from the published shard artifacts rather than
+the API, shards are downloaded once per generation and kept in an on-disk
+cache, decoded shards are kept in memory. The shard listing is revalidated
+with a conditional request at most every ``refresh_interval`` seconds, a
+lookup therefore only hits the network when a shard it needs changed.
+Lookups of unknown packages or versions skip the shard download when the
+package filter published with the index rules them out.
+
+Requires the ``client`` extra (``httpx``)::
+
+    with RegistryClient("https://registry.example.com") as client:
+        client.versions("core")
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import httpx
+
+from opaque_registry.artifacts import unpack_artifact
+from opaque_registry.existence_filter import (
+    package_key,
+    package_version_key,
+    unpack_package_filter,
+)
+from opaque_registry.sharding import derive_shard_id_from_package_id
+
+CLIENT_CACHE_DIR = os.getenv(
+    "OPAQUE_REGISTRY_CLIENT_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "opaque-registry"),
+)
+
+SHARDS_LISTING_FILE = "shards.json"
+PACKAGE_FILTER_FILE = "package_filter.msgpack"
+
+
+class DependenciesUnavailableError(Exception):
+    """The version was published in a shard predating the dependency lists,
+    the registry must rebuild its shards"""
+
+
+def _write_atomically(path: Path, data: bytes):
+    # concurrent clients sharing the cache never read a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class RegistryClient:
+    def __init__(
+        self,
+        base_url: str,
+        cache_dir: str | os.PathLike = CLIENT_CACHE_DIR,
+        refresh_interval: float = 60,
+        max_decoded_shards: int = 64,
+        timeout: float = 10,
+    ):
+        self.refresh_interval = refresh_interval
+        self.max_decoded_shards = max_decoded_shards
+        self._http = httpx.Client(base_url=base_url, timeout=timeout)
+        self._cache_dir = Path(cache_dir)
+        (self._cache_dir / "shards").mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._shards: dict[int, dict] = {}
+        self._shards_etag = None
+        self._shards_fetched_at = 0.0
+        # (shard_id, generation) -> decoded shard, least recently used first
+        self._decoded_shards: OrderedDict[tuple[int, int], dict] = OrderedDict()
+        # (bloom filter, shard generations it covers)
+        self._package_filter = None
+        self._package_filter_etag = None
+        self._load_shards_listing()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._http.close()
+
+    def _load_shards_listing(self):
+        listing_path = self._cache_dir / SHARDS_LISTING_FILE
+        if not listing_path.exists():
+            return
+        try:
+            listing = json.loads(listing_path.read_bytes())
+        except ValueError:
+            return
+        self._shards = {shard["id"]: shard for shard in listing["shards"]}
+        self._shards_etag = listing["etag"]
+        self._shards_fetched_at = listing["fetched_at"]
+        package_filter_path = self._cache_dir / PACKAGE_FILTER_FILE
+        if package_filter_path.exists():
+            self._package_filter = unpack_package_filter(
+                package_filter_path.read_bytes()
+            )
+            self._package_filter_etag = listing.get("package_filter_etag")
+
+    def refresh(self, force: bool = False):
+        """Revalidate the shard listing if older than ``refresh_interval``"""
+        with self._lock:
+            now = time.time()
+            if not force and now - self._shards_fetched_at < self.refresh_interval:
+                return
+            headers = {}
+            if self._shards_etag is not None and self._shards:
+                headers["If-None-Match"] = self._shards_etag
+            response = self._http.get("/shards/", headers=headers)
+            if response.status_code != 304:
+                response.raise_for_status()
+                self._shards = {
+                    shard["id"]: shard for shard in response.json()["shards"]
+                }
+                self._shards_etag = response.headers.get("ETag")
+            self._shards_fetched_at = now
+            if self._package_filter_is_stale():
+                self._refresh_package_filter()
+            _write_atomically(
+                self._cache_dir / SHARDS_LISTING_FILE,
+                json.dumps(
+                    {
+                        "etag": self._shards_etag,
+                        "fetched_at": self._shards_fetched_at,
+                        "shards": list(self._shards.values()),
+                        "package_filter_etag": self._package_filter_etag,
+                    }
+                ).encode(),
+            )
+
+    def _package_filter_is_stale(self) -> bool:
+        if self._package_filter is None:
+            return True
+        _, shard_generations = self._package_filter
+        return any(
+            shard_generations.get(shard_id, -1) < shard["generation"]
+            for shard_id, shard in self._shards.items()
+        )
+
+    def _refresh_package_filter(self):
+        headers = {}
+        if self._package_filter_etag is not None and self._package_filter is not None:
+            headers["If-None-Match"] = self._package_filter_etag
+        try:
+            response = self._http.get(
+                "/shards/filter", headers=headers, follow_redirects=True
+            )
+        except httpx.HTTPError:
+            # the filter is only an optimization, lookups work without it
+            return
+        if response.status_code != 200:
+            return
+        self._package_filter = unpack_package_filter(response.content)
+        self._package_filter_etag = response.headers.get("ETag")
+        _write_atomically(self._cache_dir / PACKAGE_FILTER_FILE, response.content)
+
+    def _excluded_by_filter(self, shard_id: int, key: str) -> bool:
+        """Whether the package filter rules out a key of a shard which is not
+        cached yet, the filter only covers the shard generations it was
+        built from"""
+        if self._package_filter is None:
+            return False
+        shard = self._shards[shard_id]
+        if (shard_id, shard["generation"]) in self._decoded_shards or (
+            self._shard_path(shard_id, shard["generation"]).exists()
+        ):
+            return False
+        bloom_filter, shard_generations = self._package_filter
+        if shard_generations.get(shard_id, -1) < shard["generation"]:
+            return False
+        return key not in bloom_filter
+
+    def _shard_path(self, shard_id: int, generation: int) -> Path:
+        return self._cache_dir / "shards" / f"{shard_id}_{generation}.msgpack"
+
+    def _download_shard(self, shard: dict) -> Path:
+        shard_path = self._shard_path(shard["id"], shard["generation"])
+        with self._http.stream("GET", shard["location"]) as response:
+            response.raise_for_status()
+            _write_atomically(shard_path, response.read())
+        # previous generations of the shard are never read again
+        for old_shard_path in shard_path.parent.glob(f"{shard['id']}_*.msgpack"):
+            if old_shard_path != shard_path:
+                old_shard_path.unlink(missing_ok=True)
+        return shard_path
+
+    def _get_shard(self, shard_id: int) -> dict:
+        shard = self._shards[shard_id]
+        # a shard without location has never been published
+        if not shard["location"]:
+            return {}
+        cache_key = (shard_id, shard["generation"])
+        with self._lock:
+            if cache_key in self._decoded_shards:
+                self._decoded_shards.move_to_end(cache_key)
+                return self._decoded_shards[cache_key]
+        shard_path = self._shard_path(shard_id, shard["generation"])
+        if not shard_path.exists():
+            shard_path = self._download_shard(shard)
+        decoded_shard = unpack_artifact(shard_path.read_bytes())
+        with self._lock:
+            self._decoded_shards[cache_key] = decoded_shard
+            while len(self._decoded_shards) > self.max_decoded_shards:
+                self._decoded_shards.popitem(last=False)
+        return decoded_shard
+
+    def lookup(self, package_id: str) -> list[dict] | None:
+        """Published versions of the package, as ``{"version", "url",
+        "dependencies"}`` entries, or None if the package is unknown"""
+        self.refresh()
+        if not self._shards:
+            return None
+        shard_id = derive_shard_id_from_package_id(
+            package_id=package_id, shard_count=len(self._shards)
+        )
+        if self._excluded_by_filter(shard_id, package_key(package_id)):
+            return None
+        return self._get_shard(shard_id).get(package_id)
+
+    def versions(self, package_id: str) -> list[str]:
+        package_versions = self.lookup(package_id) or []
+        return [package_version["version"] for package_version in package_versions]
+
+    def dependencies(self, package_id: str, version: str) -> list[tuple[str, str]]:
+        """Direct dependencies of a published version
+
+        :raises DependenciesUnavailableError: when its shard has no dependency
+            lists, rather than resolving an incomplete tree
+        """
+        self.refresh()
+        if self._shards and self._excluded_by_filter(
+            derive_shard_id_from_package_id(
+                package_id=package_id, shard_count=len(self._shards)
+            ),
+            package_version_key(package_id, version),
+        ):
+            raise LookupError(f"package version '{package_id}@{version}' not found")
+        for package_version in self.lookup(package_id) or []:
+            if package_version["version"] != version:
+                continue
+            if "dependencies" not in package_version:
+                raise DependenciesUnavailableError(
+                    f"the shard of '{package_id}@{version}' has no dependency lists"
+                )
+            return [
+                (dependency, dependency_version)
+                for dependency, dependency_version in package_version["dependencies"]
+            ]
+        raise LookupError(f"package version '{package_id}@{version}' not found")
+
+    def resolve(self, package_id: str, version: str) -> set[tuple[str, str]]:
+        """Every package version the given one depends on, directly or not
+
+        :raises DependenciesUnavailableError: see ``dependencies``
+        """
+        resolved = set()
+        pending = [(package_id, version)]
+        while pending:
+            for dependency in self.dependencies(*pending.pop()):
+                if dependency not in resolved:
+                    resolved.add(dependency)
+                    pending.append(dependency)
+        return resolved
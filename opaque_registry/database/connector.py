@@ -1,4 +1,5 @@
 import os
+import time
 
 from sqlalchemy import create_engine
 from sqlalchemy.ext.asyncio import (
@@ -9,22 +10,56 @@ from sqlalchemy.ext.asyncio import (
 )
 from sqlalchemy.orm.session import Session, sessionmaker
 
+from opaque_registry.database.metrics import (
+    DB_SESSION_DURATION,
+    instrument_engine_pool,
+)
 from opaque_registry.database.utils import inject_psycopg_dialect
+from opaque_registry.tracing import instrument_engine_tracing
 
 DB_URL = inject_psycopg_dialect(os.environ.get("OPAQUE_REGISTRY_DB_URL"))
+# pool sizes are per process, each API worker owns its own pool
+DB_POOL_SIZE = int(os.getenv("OPAQUE_REGISTRY_DB_POOL_SIZE", "5"))
+DB_POOL_MAX_OVERFLOW = int(os.getenv("OPAQUE_REGISTRY_DB_POOL_MAX_OVERFLOW", "10"))
 
 ENGINE = None
+# tasks use their own engine, they may run in the API process (embedded mode)
+SYNC_ENGINE = None
 
 
 def init_sync_db_engine():
-    global ENGINE
-    ENGINE = create_engine(DB_URL)
+    global SYNC_ENGINE
+    if SYNC_ENGINE is None:
+        SYNC_ENGINE = create_engine(DB_URL)
+        instrument_engine_tracing(engine=SYNC_ENGINE)
 
 
 def init_async_db_engine():
     global ENGINE
     if ENGINE is None:
-        ENGINE = create_async_engine(DB_URL, future=True)
+        ENGINE = create_async_engine(
+            DB_URL,
+            future=True,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_POOL_MAX_OVERFLOW,
+            pool_pre_ping=True,
+        )
+        instrument_engine_pool(engine=ENGINE.sync_engine, pool_size=DB_POOL_SIZE)
+        instrument_engine_tracing(engine=ENGINE.sync_engine)
+
+
+async def dispose_async_db_engine():
+    global ENGINE
+    if ENGINE is not None:
+        await ENGINE.dispose()
+        ENGINE = None
+
+
+def dispose_sync_db_engine():
+    global SYNC_ENGINE
+    if SYNC_ENGINE is not None:
+        SYNC_ENGINE.dispose()
+        SYNC_ENGINE = None
 
 
 def create_async_db_sessionmaker():
@@ -32,11 +67,12 @@ def create_async_db_sessionmaker():
 
 
 def create_sync_db_sessionmaker():
-    return sessionmaker(ENGINE, class_=Session, expire_on_commit=False)
+    return sessionmaker(SYNC_ENGINE, class_=Session, expire_on_commit=False)
 
 
 async def get_db_session() -> AsyncSession:
     async_sessionmaker = create_async_db_sessionmaker()
+    session_start = time.perf_counter()
     async with async_sessionmaker() as session:
         try:
             yield session
@@ -46,3 +82,4 @@ async def get_db_session() -> AsyncSession:
             raise exc
         finally:
             await session.close()
+            DB_SESSION_DURATION.observe(time.perf_counter() - session_start)
@@ -2,6 +2,7 @@ import asyncio
 
 import opaque_registry.database.models as db_models
 from opaque_registry.database.connector import init_async_db_engine
+from opaque_registry.event_loop import install_event_loop_policy
 
 
 async def init_models():
@@ -14,5 +15,5 @@ async def init_models():
 
 
 if __name__ == "__main__":
-    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    install_event_loop_policy()
     asyncio.run(init_models())
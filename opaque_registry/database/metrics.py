@@ -0,0 +1,33 @@
+from prometheus_client import Gauge, Histogram
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DB_SESSION_DURATION = Histogram(
+    "opaque_registry_db_session_duration_seconds",
+    "Lifetime of the database sessions opened for API requests",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+DB_POOL_SIZE = Gauge(
+    "opaque_registry_db_pool_size",
+    "Configured size of the database connection pools",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "opaque_registry_db_pool_connections",
+    "Database connections currently opened by the pools",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "opaque_registry_db_pool_checked_out_connections",
+    "Database connections currently checked out of the pools",
+    multiprocess_mode="livesum",
+)
+
+
+def instrument_engine_pool(engine: Engine, pool_size: int):
+    # per process, set again when the engine is recreated
+    DB_POOL_SIZE.set(pool_size)
+    event.listen(engine, "connect", lambda *args: DB_POOL_CONNECTIONS.inc())
+    event.listen(engine, "close", lambda *args: DB_POOL_CONNECTIONS.dec())
+    event.listen(engine, "checkout", lambda *args: DB_POOL_CHECKED_OUT.inc())
+    event.listen(engine, "checkin", lambda *args: DB_POOL_CHECKED_OUT.dec())
@@ -1,11 +1,14 @@
 from opaque_registry.database.models.base import Base
+from opaque_registry.database.models.outbox import TaskOutbox
 from opaque_registry.database.models.packages import (
     Package,
     PackageTag,
     PackageVersion,
     PackageVersionDependency,
+    PackageVersionDependent,
 )
-from opaque_registry.database.models.shards import Shard
+from opaque_registry.database.models.shards import Shard, ShardChange, ShardRebuild
+from opaque_registry.database.models.summaries import PackageSummary
 
 __all__ = [
     "Base",
@@ -13,5 +16,10 @@ __all__ = [
     "PackageVersion",
     "PackageTag",
     "PackageVersionDependency",
+    "PackageVersionDependent",
+    "PackageSummary",
+    "TaskOutbox",
     "Shard",
+    "ShardChange",
+    "ShardRebuild",
 ]
@@ -0,0 +1,22 @@
+from datetime import datetime
+
+from sqlalchemy import JSON, BigInteger, DateTime, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from opaque_registry.database.models.base import Base
+
+
+class TaskOutbox(Base):
+    """Tasks written in the same transaction as the data they act on, sent to
+    the broker once committed"""
+
+    __tablename__ = "task_outbox"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    task_name: Mapped[str] = mapped_column(nullable=False)
+    kwargs: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)
+    # serialized trace context of the request which queued the task
+    trace_context: Mapped[dict] = mapped_column(JSON, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
@@ -1,4 +1,6 @@
-from sqlalchemy import ForeignKey, ForeignKeyConstraint
+from datetime import datetime
+
+from sqlalchemy import DateTime, ForeignKey, ForeignKeyConstraint, Index, func
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -27,6 +29,8 @@ class PackageTag(Base):
 
     package_id: Mapped[str] = mapped_column(ForeignKey(Package.id), primary_key=True)
     tag: Mapped[str] = mapped_column(primary_key=True)
+    # shard of the package, part of the foreign key once partitioned
+    shard_id: Mapped[int] = mapped_column(nullable=False)
 
 
 class PackageVersion(Base):
@@ -36,6 +40,33 @@ class PackageVersion(Base):
     version: Mapped[str] = mapped_column(primary_key=True)
     url: Mapped[str] = mapped_column(nullable=False)
     published: Mapped[bool] = mapped_column(nullable=False, default=False)
+    # generation of the shard this version was first packed into
+    published_generation: Mapped[int] = mapped_column(nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    # parsed semver components, used to sort and filter versions in SQL
+    # (prereleases are ordered lexically, which is close enough for tags
+    # like alpha/beta/rc)
+    version_major: Mapped[int] = mapped_column(nullable=False)
+    version_minor: Mapped[int] = mapped_column(nullable=False)
+    version_patch: Mapped[int] = mapped_column(nullable=False)
+    version_prerelease: Mapped[str] = mapped_column(nullable=True)
+    # shard of the package, shard generation reads the versions by shard and
+    # the package tables may be partitioned by shard (see the migrations)
+    shard_id: Mapped[int] = mapped_column(ForeignKey(Shard.id), nullable=False)
+
+    __table_args__ = (
+        Index(
+            "ix_package_version_semver",
+            "package_id",
+            "version_major",
+            "version_minor",
+            "version_patch",
+            "version_prerelease",
+        ),
+        Index("ix_package_version_shard", "shard_id", "package_id"),
+    )
 
 
 class PackageVersionDependency(Base):
@@ -45,6 +76,9 @@ class PackageVersionDependency(Base):
     version: Mapped[str] = mapped_column(primary_key=True)
     dependency: Mapped[str] = mapped_column(primary_key=True)
     dependency_version: Mapped[str] = mapped_column(primary_key=True)
+    # shards of both packages, part of the foreign keys once partitioned
+    shard_id: Mapped[int] = mapped_column(nullable=False)
+    dependency_shard_id: Mapped[int] = mapped_column(nullable=False)
 
     package_version: Mapped[PackageVersion] = relationship(
         foreign_keys=[package_id, version],
@@ -62,4 +96,36 @@ class PackageVersionDependency(Base):
             ["dependency", "dependency_version"],
             ["package_version.package_id", "package_version.version"],
         ),
+        Index("ix_package_version_dependency_reverse", dependency, dependency_version),
+    )
+
+
+class PackageVersionDependent(Base):
+    """Transitive closure of the dependencies, one row per package version
+    depending directly or indirectly on ``dependency``
+
+    Maintained when versions are created, published versions and their
+    dependencies are immutable so rows are never updated.
+    """
+
+    __tablename__ = "package_version_dependent"
+
+    dependency: Mapped[str] = mapped_column(primary_key=True)
+    dependency_version: Mapped[str] = mapped_column(primary_key=True)
+    package_id: Mapped[str] = mapped_column(primary_key=True)
+    version: Mapped[str] = mapped_column(primary_key=True)
+    # length of the shortest dependency path, 1 for direct dependents
+    depth: Mapped[int] = mapped_column(nullable=False)
+    shard_id: Mapped[int] = mapped_column(nullable=False)
+    dependency_shard_id: Mapped[int] = mapped_column(nullable=False)
+
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["dependency", "dependency_version"],
+            ["package_version.package_id", "package_version.version"],
+        ),
+        ForeignKeyConstraint(
+            ["package_id", "version"],
+            ["package_version.package_id", "package_version.version"],
+        ),
     )
@@ -1,3 +1,6 @@
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Index, func
 from sqlalchemy.orm import Mapped, mapped_column
 
 from opaque_registry.database.models.base import Base
@@ -9,3 +12,40 @@ class Shard(Base):
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
     location: Mapped[str] = mapped_column(nullable=False)
     generation: Mapped[int] = mapped_column(nullable=False, default=0)
+
+
+class ShardChange(Base):
+    """Append-only log of published shard generations, its id is the cursor
+    of the change feed: ids are committed in increasing order (see
+    ``services.shards.SHARD_CHANGES_LOCK_KEY``)"""
+
+    __tablename__ = "shard_change"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    shard_id: Mapped[int] = mapped_column(ForeignKey(Shard.id), nullable=False)
+    # generation of the artifact, package versions first published in it have
+    # the same published_generation
+    generation: Mapped[int] = mapped_column(nullable=False)
+    location: Mapped[str] = mapped_column(nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+    __table_args__ = (
+        Index("ix_shard_change_shard_id_created_at", shard_id, created_at),
+    )
+
+
+class ShardRebuild(Base):
+    """Rebuild of every shard, a shard is rebuilt once a change was recorded
+    for it after ``started_at``"""
+
+    __tablename__ = "shard_rebuild"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    started_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    finished_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
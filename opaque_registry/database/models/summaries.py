@@ -0,0 +1,38 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, ForeignKey, Index
+from sqlalchemy.orm import Mapped, mapped_column
+
+from opaque_registry.database.models.base import Base
+from opaque_registry.database.models.packages import Package
+
+
+class PackageSummary(Base):
+    """Denormalized per-package listing data, maintained incrementally on writes"""
+
+    __tablename__ = "package_summary"
+
+    package_id: Mapped[str] = mapped_column(ForeignKey(Package.id), primary_key=True)
+    # shard of the package, part of the foreign key once partitioned
+    shard_id: Mapped[int] = mapped_column(nullable=False)
+    description: Mapped[str] = mapped_column(nullable=True)
+    latest_version: Mapped[str] = mapped_column(nullable=True)
+    version_count: Mapped[int] = mapped_column(nullable=False, default=0)
+    published_version_count: Mapped[int] = mapped_column(nullable=False, default=0)
+    # number of package versions depending on this package
+    dependent_count: Mapped[int] = mapped_column(nullable=False, default=0)
+    last_version_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    last_published_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+
+    __table_args__ = (
+        Index(
+            "ix_package_summary_recent",
+            last_published_at.desc().nulls_last(),
+            "package_id",
+        ),
+        Index("ix_package_summary_popular", dependent_count.desc(), "package_id"),
+    )
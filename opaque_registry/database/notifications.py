@@ -0,0 +1,149 @@
+"""Postgres ``LISTEN``/``NOTIFY`` listener of the API workers
+
+Each worker keeps one dedicated connection listening to a channel, waiters
+are woken up when a notification is received instead of polling the
+database. The connection is reopened if it is lost, waiters should still
+bound their wait since notifications sent meanwhile are not replayed.
+
+Notifications are delivered in commit order: once a notification sent by a
+worker is received back (see ``NotificationListener.sync``), every
+notification committed before it was received too. A worker has at most one
+such notification in flight per channel, sent over its own connection: the
+syncs requested meanwhile all wait for the next one.
+"""
+import asyncio
+import logging
+import uuid
+from collections.abc import Callable
+
+import psycopg
+from sqlalchemy.engine.url import make_url
+
+from opaque_registry.database.connector import DB_URL
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_DELAY = 5
+SYNC_TIMEOUT = 1
+
+
+def get_psycopg_conninfo(db_url) -> str:
+    return (
+        make_url(db_url)
+        .set(drivername="postgresql")
+        .render_as_string(hide_password=False)
+    )
+
+
+class NotificationListener:
+    def __init__(
+        self, channel: str, on_notify: Callable[[str | None], None] | None = None
+    ):
+        """:param on_notify: called with the payload of each notification, and
+        with None on (re)connection since notifications may have been missed
+        """
+        self.channel = channel
+        self.sync_channel = f"{channel}_sync"
+        self.on_notify = on_notify
+        self.connected = False
+        self._event = asyncio.Event()
+        # token -> future set once its sync notification is received
+        self._syncs: dict[str, asyncio.Future] = {}
+        # set by the next sync notification sent, shared by its callers
+        self._next_sync: asyncio.Future | None = None
+        self._sync_requested = asyncio.Event()
+
+    def current_event(self) -> asyncio.Event:
+        """Event set by the next notification, must be retrieved before
+        checking for changes so a notification is never missed"""
+        return self._event
+
+    def _notify_waiters(self, payload: str | None = None):
+        if self.on_notify is not None:
+            self.on_notify(payload)
+        event, self._event = self._event, asyncio.Event()
+        event.set()
+
+    async def run(self):
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    get_psycopg_conninfo(DB_URL), autocommit=True
+                ) as connection:
+                    await connection.execute(f'LISTEN "{self.channel}"')
+                    await connection.execute(f'LISTEN "{self.sync_channel}"')
+                    logger.info(f"listening to '{self.channel}' notifications")
+                    self.connected = True
+                    sync_sender = asyncio.create_task(self._send_syncs())
+                    try:
+                        # changes may have been missed while disconnected
+                        self._notify_waiters()
+                        async for notify in connection.notifies():
+                            if notify.channel == self.sync_channel:
+                                self._on_sync(notify.payload)
+                            else:
+                                self._notify_waiters(notify.payload)
+                    finally:
+                        self.connected = False
+                        sync_sender.cancel()
+                        await asyncio.gather(sync_sender, return_exceptions=True)
+            except (OSError, psycopg.Error) as exc:
+                logger.warning(
+                    f"'{self.channel}' listener connection lost ({exc}), "
+                    f"reconnecting in {RECONNECT_DELAY}s"
+                )
+                await asyncio.sleep(RECONNECT_DELAY)
+
+    def _on_sync(self, token: str):
+        received = self._syncs.pop(token, None)
+        if received is not None and not received.done():
+            received.set_result(None)
+
+    async def sync(self):
+        """Wait until every notification committed before the call is received
+
+        :raises asyncio.TimeoutError: the sync notification was not received
+            within ``SYNC_TIMEOUT``, the connection may be lost
+        """
+        if self._next_sync is None:
+            self._next_sync = asyncio.get_running_loop().create_future()
+            self._sync_requested.set()
+        # the sync goes on for the other callers when one is cancelled
+        await asyncio.wait_for(asyncio.shield(self._next_sync), SYNC_TIMEOUT)
+
+    async def _send_syncs(self):
+        """Send one sync notification for the syncs requested since the
+        previous one, once it is received, while listening"""
+        connection = None
+        try:
+            while True:
+                await self._sync_requested.wait()
+                self._sync_requested.clear()
+                token = uuid.uuid4().hex
+                # syncs requested from now on may have seen changes committed
+                # after this notification, they wait for the next one
+                received = self._syncs[token] = self._next_sync
+                self._next_sync = None
+                try:
+                    if connection is None:
+                        # opened on the first sync, most channels never sync
+                        connection = await psycopg.AsyncConnection.connect(
+                            get_psycopg_conninfo(DB_URL), autocommit=True
+                        )
+                    await connection.execute(
+                        "SELECT pg_notify(%s, %s)", (self.sync_channel, token)
+                    )
+                    await asyncio.wait_for(asyncio.shield(received), SYNC_TIMEOUT)
+                except asyncio.TimeoutError:
+                    logger.warning(f"'{self.channel}' sync notification not received")
+                except (OSError, psycopg.Error) as exc:
+                    # the waiters time out, the next sync reconnects
+                    logger.warning(f"'{self.channel}' sync failed ({exc})")
+                    if connection is not None:
+                        await connection.close()
+                        connection = None
+                finally:
+                    self._syncs.pop(token, None)
+        finally:
+            if connection is not None:
+                await connection.close()
@@ -0,0 +1,102 @@
+"""Embedded publisher, for single-node deployments without Celery
+
+With ``OPAQUE_REGISTRY_EMBEDDED=1`` the API generates the shards and the
+index itself: tasks drained from the outbox run as background jobs of the
+API process instead of being sent to the broker. Jobs of a shard, or of the
+index, are debounced for ``OPAQUE_REGISTRY_EMBEDDED_DEBOUNCE`` seconds and
+never run concurrently, a burst of publications ends up in one generation.
+
+Jobs are only coordinated inside the process, the API must run a single
+worker. Combined with ``OPAQUE_REGISTRY_STORAGE=local``, the artifacts are
+served by the API as well and neither Redis, Celery nor S3 are needed.
+"""
+import asyncio
+import logging
+import os
+
+import opaque_registry.services.shards as shards_service
+from opaque_registry.async_tasks.dispatch import (
+    CREATE_SHARD_TASK,
+    CREATE_WHOLE_INDEX_TASK,
+)
+from opaque_registry.database.connector import create_async_db_sessionmaker
+from opaque_registry.tracing import attached_trace_context
+
+logger = logging.getLogger(__name__)
+
+EMBEDDED_PUBLISHER_ENABLED = os.getenv("OPAQUE_REGISTRY_EMBEDDED", "0") == "1"
+EMBEDDED_DEBOUNCE = float(os.getenv("OPAQUE_REGISTRY_EMBEDDED_DEBOUNCE", "0.1"))
+# the outbox is the only trigger of the jobs, it is polled more often
+EMBEDDED_OUTBOX_POLL_INTERVAL = float(
+    os.getenv("OPAQUE_REGISTRY_EMBEDDED_OUTBOX_POLL_INTERVAL", "0.1")
+)
+
+
+def _generate(task_name: str, **kwargs):
+    # imported on first job, the API does not load msgpack or boto3 otherwise
+    from opaque_registry.async_tasks.shards.generation import (
+        generate_shard,
+        generate_whole_index,
+    )
+
+    if task_name == CREATE_SHARD_TASK:
+        generate_shard(shard_id=kwargs["shard_id"])
+    else:
+        generate_whole_index()
+
+
+class EmbeddedPublisher:
+    def __init__(self, debounce: float = EMBEDDED_DEBOUNCE):
+        self.debounce = debounce
+        # jobs waiting for their debounce delay or their lock
+        self._scheduled: set[tuple] = set()
+        self._locks: dict[tuple, asyncio.Lock] = {}
+        self._jobs: set[asyncio.Task] = set()
+
+    async def start(self):
+        """Schedule the shards left unpublished by a previous process"""
+        async with create_async_db_sessionmaker()() as db_session:
+            pending_shard_ids = await shards_service.get_pending_shard_ids(
+                db_session=db_session
+            )
+        if pending_shard_ids:
+            logger.info(
+                f"[Embedded] publishing pending shards {pending_shard_ids} on startup"
+            )
+        for shard_id in pending_shard_ids:
+            await self.send_task(CREATE_SHARD_TASK, shard_id=shard_id)
+        await self.send_task(CREATE_WHOLE_INDEX_TASK)
+
+    async def stop(self):
+        # interrupted shards stay unpublished, start() schedules them again
+        for job in self._jobs:
+            job.cancel()
+        await asyncio.gather(*self._jobs, return_exceptions=True)
+
+    async def send_task(
+        self, task_name: str, trace_context: dict[str, str] | None = None, **kwargs
+    ):
+        """Outbox sender running the task in the background"""
+        if task_name == CREATE_SHARD_TASK:
+            job_key = (task_name, kwargs["shard_id"])
+        elif task_name == CREATE_WHOLE_INDEX_TASK:
+            job_key = (task_name,)
+        else:
+            raise ValueError(f"unknown task '{task_name}'")
+        if job_key in self._scheduled:
+            return
+        self._scheduled.add(job_key)
+        job = asyncio.create_task(self._run(job_key, trace_context, kwargs))
+        self._jobs.add(job)
+        job.add_done_callback(self._jobs.discard)
+
+    async def _run(self, job_key: tuple, trace_context: dict[str, str], kwargs: dict):
+        await asyncio.sleep(self.debounce)
+        async with self._locks.setdefault(job_key, asyncio.Lock()):
+            # tasks sent from now on are left for the next job
+            self._scheduled.discard(job_key)
+            try:
+                with attached_trace_context(trace_context):
+                    await asyncio.to_thread(_generate, job_key[0], **kwargs)
+            except Exception:
+                logger.exception(f"[Embedded] {job_key[0]} {kwargs} failed")
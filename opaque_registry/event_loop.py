@@ -0,0 +1,19 @@
+import asyncio
+import sys
+
+
+def install_event_loop_policy() -> str:
+    """Install the fastest event loop policy available on the current platform
+
+    :returns: the matching uvicorn ``loop`` setting
+    """
+    if sys.platform == "win32":
+        # psycopg async connections do not support the default proactor loop
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+        return "asyncio"
+    try:
+        import uvloop
+    except ImportError:
+        return "asyncio"
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return "uvloop"
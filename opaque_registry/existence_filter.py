@@ -0,0 +1,102 @@
+"""Bloom filter of the package ids and ``package_id@version`` pairs, shared
+by the registry and its clients
+
+A key missing from the filter certainly does not exist, a key found in it
+exists with a probability of ``1 - OPAQUE_REGISTRY_PACKAGE_FILTER_FP_RATE``.
+
+The published artifact is a msgpack ``[format_version, filter]`` array,
+``filter`` holding the bloom ``size``, ``hash_count`` and ``bits`` along
+with the ``[shard_id, generation]`` pairs the filter was built from: it only
+covers the versions published by these generations or older.
+"""
+import hashlib
+import math
+import os
+
+PACKAGE_FILTER_FORMAT_VERSION = 1
+PACKAGE_FILTER_KEY = "filters/packages"
+PACKAGE_FILTER_FALSE_POSITIVE_RATE = float(
+    os.getenv("OPAQUE_REGISTRY_PACKAGE_FILTER_FP_RATE", "0.01")
+)
+
+
+def package_key(package_id: str) -> str:
+    return package_id
+
+
+def package_version_key(package_id: str, version: str) -> str:
+    return f"{package_id}@{version}"
+
+
+class BloomFilter:
+    def __init__(self, size: int, hash_count: int, bits: bytearray | None = None):
+        self.size = size
+        self.hash_count = hash_count
+        self.bits = bits if bits is not None else bytearray((size + 7) // 8)
+
+    @classmethod
+    def for_capacity(
+        cls,
+        capacity: int,
+        false_positive_rate: float = PACKAGE_FILTER_FALSE_POSITIVE_RATE,
+    ) -> "BloomFilter":
+        capacity = max(capacity, 1)
+        size = math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+        hash_count = max(round(size / capacity * math.log(2)), 1)
+        return cls(size=size, hash_count=hash_count)
+
+    def _positions(self, key: str):
+        # double hashing, one digest gives every position
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first_hash = int.from_bytes(digest[:8], "little")
+        second_hash = int.from_bytes(digest[8:], "little") | 1
+        for index in range(self.hash_count):
+            yield (first_hash + index * second_hash) % self.size
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+def pack_package_filter(
+    bloom_filter: BloomFilter, shard_generations: dict[int, int]
+) -> bytes:
+    # imported here, the API builds filters without publishing them
+    import msgpack
+
+    return msgpack.packb(
+        [
+            PACKAGE_FILTER_FORMAT_VERSION,
+            {
+                "size": bloom_filter.size,
+                "hash_count": bloom_filter.hash_count,
+                "bits": bytes(bloom_filter.bits),
+                # pairs, integer map keys are rejected by default decoders
+                "generations": sorted(shard_generations.items()),
+            },
+        ]
+    )
+
+
+def unpack_package_filter(data) -> tuple[BloomFilter, dict[int, int]]:
+    """:returns: the filter and the shard generations it covers"""
+    import msgpack
+
+    _, package_filter = msgpack.unpackb(data)
+    return (
+        BloomFilter(
+            size=package_filter["size"],
+            hash_count=package_filter["hash_count"],
+            bits=bytearray(package_filter["bits"]),
+        ),
+        {
+            shard_id: generation
+            for shard_id, generation in package_filter["generations"]
+        },
+    )
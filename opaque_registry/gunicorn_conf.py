@@ -0,0 +1,27 @@
+"""Gunicorn settings for production deployments
+
+Usage: ``gunicorn -c python:opaque_registry.gunicorn_conf opaque_registry.main:app``
+
+The application is imported once in the master process (``preload_app``) and
+forked into workers, each of them opening its own database engine on startup.
+"""
+import os
+
+from prometheus_client import multiprocess
+
+from opaque_registry.server import GRACEFUL_SHUTDOWN_TIMEOUT, HOST, PORT, WORKERS
+
+bind = f"{HOST}:{PORT}"
+workers = WORKERS
+# picks uvloop and httptools when they are installed
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+graceful_timeout = GRACEFUL_SHUTDOWN_TIMEOUT
+timeout = 60
+keepalive = 5
+
+
+def child_exit(server, worker):
+    # drops the live gauges of exited workers from /metrics
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,19 +1,118 @@
 import asyncio
+from contextlib import asynccontextmanager, suppress
+from pathlib import Path
 
-import uvicorn
-from fastapi import Depends, FastAPI
+from fastapi import FastAPI
+from fastapi.staticfiles import StaticFiles
 
+from opaque_registry.api.errors.base import ApiException
+from opaque_registry.api.metrics import PrometheusMiddleware, api_exception_handler
 from opaque_registry.api.routes import load_routers
-from opaque_registry.database.connector import init_async_db_engine
+from opaque_registry.api.tracing import TracingMiddleware
+from opaque_registry.async_tasks.outbox import (
+    OUTBOX_DISPATCHER_ENABLED,
+    run_outbox_dispatcher,
+)
+from opaque_registry.database.connector import (
+    dispose_async_db_engine,
+    dispose_sync_db_engine,
+    init_async_db_engine,
+)
+from opaque_registry.embedded import (
+    EMBEDDED_OUTBOX_POLL_INTERVAL,
+    EMBEDDED_PUBLISHER_ENABLED,
+    EmbeddedPublisher,
+)
+from opaque_registry.services.package_filter import (
+    PACKAGE_FILTER_ENABLED,
+    package_created_listener,
+    package_id_filter,
+)
+from opaque_registry.services.shards import shard_changes_listener
+from opaque_registry.services.snapshot import (
+    SNAPSHOT_ENABLED,
+    refresh_snapshot,
+    run_snapshot_refresher,
+)
+from opaque_registry.storage import (
+    LOCAL_STORAGE_DIR,
+    LOCAL_STORAGE_URL,
+    STORAGE_BACKEND,
+)
+from opaque_registry.tracing import init_tracing, shutdown_tracing
 
-asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-init_async_db_engine()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # the engine and span exporter are opened per worker, after any fork
+    init_tracing(service_name="opaque-registry-api")
+    init_async_db_engine()
+    embedded_publisher = None
+    outbox_dispatcher = None
+    if EMBEDDED_PUBLISHER_ENABLED:
+        embedded_publisher = EmbeddedPublisher()
+        await embedded_publisher.start()
+        outbox_dispatcher = asyncio.create_task(
+            run_outbox_dispatcher(
+                poll_interval=EMBEDDED_OUTBOX_POLL_INTERVAL,
+                send=embedded_publisher.send_task,
+            )
+        )
+    elif OUTBOX_DISPATCHER_ENABLED:
+        outbox_dispatcher = asyncio.create_task(run_outbox_dispatcher())
+    shard_changes_listener_task = asyncio.create_task(shard_changes_listener.run())
+    package_created_listener_task = None
+    if PACKAGE_FILTER_ENABLED:
+        # the filter is built once listening, see services.package_filter
+        package_created_listener_task = asyncio.create_task(
+            package_created_listener.run()
+        )
+    snapshot_refresher = None
+    if SNAPSHOT_ENABLED:
+        # requests are only accepted once the first snapshot is loaded
+        await refresh_snapshot()
+        snapshot_refresher = asyncio.create_task(run_snapshot_refresher())
+    yield
+    if snapshot_refresher is not None:
+        snapshot_refresher.cancel()
+        with suppress(asyncio.CancelledError):
+            await snapshot_refresher
+    if package_created_listener_task is not None:
+        package_created_listener_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await package_created_listener_task
+        await package_id_filter.stop()
+    shard_changes_listener_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await shard_changes_listener_task
+    if outbox_dispatcher is not None:
+        outbox_dispatcher.cancel()
+        with suppress(asyncio.CancelledError):
+            await outbox_dispatcher
+    if embedded_publisher is not None:
+        await embedded_publisher.stop()
+    await dispose_async_db_engine()
+    dispose_sync_db_engine()
+    shutdown_tracing()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(PrometheusMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_exception_handler(ApiException, api_exception_handler)
 
 load_routers(app=app)
 
+if STORAGE_BACKEND == "local" and LOCAL_STORAGE_URL.startswith("/"):
+    Path(LOCAL_STORAGE_DIR).mkdir(parents=True, exist_ok=True)
+    app.mount(
+        LOCAL_STORAGE_URL,
+        StaticFiles(directory=LOCAL_STORAGE_DIR),
+        name="artifacts",
+    )
+
 
 if __name__ == "__main__":
-    uvicorn.run(app)
+    from opaque_registry.server import run
+
+    run()
@@ -0,0 +1,122 @@
+"""Sampling profiler of the running process, for on-demand profiles
+
+A sampler thread records the Python stack of every other thread each
+``OPAQUE_REGISTRY_PROFILE_INTERVAL`` seconds and weighs it by the time
+elapsed (``wall``) or by the CPU time the thread consumed since its previous
+sample (``cpu``, Linux only): waiting threads, and an event loop waiting for
+I/O, only show in wall profiles. The coroutine running on an event loop is
+part of its thread stack, down to the awaited call.
+
+Profiles are rendered as collapsed stacks (``thread;frame;frame weight`` per
+line, weights in microseconds), read by flamegraph.pl, inferno or speedscope.
+
+Nothing runs outside of a profile, the sampler thread only exists between
+``SamplingProfiler.start`` and ``SamplingProfiler.stop``.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from enum import Enum
+
+PROFILE_INTERVAL = float(os.getenv("OPAQUE_REGISTRY_PROFILE_INTERVAL", "0.005"))
+
+
+class ProfileMode(str, Enum):
+    wall = "wall"
+    cpu = "cpu"
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    # ";" separates the frames of collapsed stacks
+    return f"{name} ({code.co_filename}:{code.co_firstlineno})".replace(";", ",")
+
+
+def _thread_stack(frame) -> list[str]:
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _thread_cpu_time(thread_id: int) -> float | None:
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(thread_id))
+    except OSError:
+        # the thread exited since its frames were retrieved
+        return None
+
+
+class SamplingProfiler:
+    def __init__(
+        self, mode: ProfileMode = ProfileMode.wall, interval: float = PROFILE_INTERVAL
+    ):
+        self.mode = ProfileMode(mode)
+        self.interval = interval
+        # stack -> seconds
+        self.samples = Counter()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._sample_until_stopped, name="profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _sample_until_stopped(self):
+        sampler_id = threading.get_ident()
+        cpu_times = {}
+        if self.mode == ProfileMode.cpu:
+            cpu_times = {
+                thread_id: _thread_cpu_time(thread_id)
+                for thread_id in sys._current_frames()
+            }
+        last_sample_at = time.perf_counter()
+        while not self._stop_event.wait(self.interval):
+            sample_at = time.perf_counter()
+            elapsed = sample_at - last_sample_at
+            last_sample_at = sample_at
+            thread_names = {
+                thread.ident: thread.name for thread in threading.enumerate()
+            }
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == sampler_id:
+                    continue
+                if self.mode == ProfileMode.cpu:
+                    cpu_time = _thread_cpu_time(thread_id)
+                    previous_cpu_time = cpu_times.get(thread_id)
+                    cpu_times[thread_id] = cpu_time
+                    if cpu_time is None or previous_cpu_time is None:
+                        continue
+                    weight = cpu_time - previous_cpu_time
+                else:
+                    weight = elapsed
+                if weight > 0:
+                    thread_name = thread_names.get(thread_id, str(thread_id))
+                    stack = (thread_name, *_thread_stack(frame))
+                    self.samples[stack] += weight
+
+    def collapsed_stacks(self) -> str:
+        lines = []
+        for stack, seconds in self.samples.most_common():
+            microseconds = round(seconds * 1_000_000)
+            if microseconds:
+                lines.append(f"{';'.join(stack)} {microseconds}\n")
+        return "".join(lines)
@@ -0,0 +1,39 @@
+import os
+
+import uvicorn
+
+from opaque_registry.event_loop import install_event_loop_policy
+
+HOST = os.getenv("OPAQUE_REGISTRY_HOST", "0.0.0.0")
+PORT = int(os.getenv("OPAQUE_REGISTRY_PORT", "8000"))
+WORKERS = int(os.getenv("OPAQUE_REGISTRY_WORKERS", str(os.cpu_count() or 1)))
+# seconds given to in-flight requests before a worker is stopped
+GRACEFUL_SHUTDOWN_TIMEOUT = int(
+    os.getenv("OPAQUE_REGISTRY_GRACEFUL_SHUTDOWN_TIMEOUT", "30")
+)
+
+
+def run():
+    loop = install_event_loop_policy()
+    try:
+        import httptools  # noqa: F401
+
+        http = "httptools"
+    except ImportError:
+        http = "h11"
+    # workers are separate processes, the database engine is created by each
+    # of them on startup (see opaque_registry.main)
+    uvicorn.run(
+        "opaque_registry.main:app",
+        host=HOST,
+        port=PORT,
+        workers=WORKERS,
+        loop=loop,
+        http=http,
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_TIMEOUT,
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    run()
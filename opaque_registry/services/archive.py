@@ -0,0 +1,96 @@
+"""Package archives hosted by the registry
+
+An uploaded archive is streamed to the artifact storage under a temporary
+key while its sha256 is computed, then moved to ``archives/<sha256>``:
+identical archives are stored once, under a URL which never changes and is
+cached as immutable. Package versions reference archives by their sha256
+instead of an URL.
+
+Uploads interrupted before their move are left under ``archives/uploads/``,
+for the bucket lifecycle rules to expire.
+"""
+import asyncio
+import hashlib
+import os
+import uuid
+from typing import AsyncIterator
+
+from opaque_registry.api.errors.archives import (
+    ArchiveNotFoundError,
+    ArchiveTooLargeError,
+    EmptyArchiveError,
+)
+from opaque_registry.api.schemas.archive import Archive
+from opaque_registry.storage import (
+    artifact_exists,
+    delete_artifact,
+    get_artifact_url,
+    move_artifact,
+    open_artifact_upload,
+)
+from opaque_registry.tracing import traced
+
+ARCHIVES_PREFIX = "archives"
+ARCHIVE_MAX_SIZE = int(
+    os.getenv("OPAQUE_REGISTRY_ARCHIVE_MAX_SIZE", str(512 * 1024 * 1024))
+)
+ARCHIVE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def get_archive_key(sha256: str) -> str:
+    return f"{ARCHIVES_PREFIX}/{sha256}"
+
+
+async def _upload_chunks(upload, chunks: AsyncIterator[bytes]) -> str:
+    """:returns: the sha256 of the uploaded chunks"""
+    archive_hash = hashlib.sha256()
+    async for chunk in chunks:
+        if upload.size + len(chunk) > ARCHIVE_MAX_SIZE:
+            raise ArchiveTooLargeError(max_size=ARCHIVE_MAX_SIZE)
+        archive_hash.update(chunk)
+        # parts are sent to the object storage by some of the writes
+        await asyncio.to_thread(upload.write, chunk)
+    if upload.size == 0:
+        raise EmptyArchiveError()
+    return archive_hash.hexdigest()
+
+
+@traced()
+async def store_archive(chunks: AsyncIterator[bytes]) -> tuple[Archive, bool]:
+    """Store an archive, at most one part of it is held in memory
+
+    :returns: the archive and whether it was not already stored
+    """
+    upload = open_artifact_upload(key=f"{ARCHIVES_PREFIX}/uploads/{uuid.uuid4()}")
+    await asyncio.to_thread(upload.__enter__)
+    try:
+        sha256 = await _upload_chunks(upload=upload, chunks=chunks)
+    except BaseException as exc:
+        # the upload is aborted
+        await asyncio.to_thread(upload.__exit__, type(exc), exc, exc.__traceback__)
+        raise
+    await asyncio.to_thread(upload.__exit__, None, None, None)
+    archive_key = get_archive_key(sha256)
+    created = not await asyncio.to_thread(artifact_exists, archive_key)
+    if created:
+        # identical concurrent uploads replace the archive by the same content
+        await asyncio.to_thread(
+            move_artifact,
+            upload.key,
+            archive_key,
+            cache_control=ARCHIVE_CACHE_CONTROL,
+        )
+    else:
+        await asyncio.to_thread(delete_artifact, upload.key)
+    archive = Archive(
+        sha256=sha256, size=upload.size, url=get_artifact_url(archive_key)
+    )
+    return archive, created
+
+
+@traced()
+async def get_archive_url(sha256: str) -> str:
+    archive_key = get_archive_key(sha256)
+    if not await asyncio.to_thread(artifact_exists, archive_key):
+        raise ArchiveNotFoundError(sha256=sha256)
+    return get_artifact_url(archive_key)
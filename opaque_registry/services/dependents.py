@@ -0,0 +1,120 @@
+from sqlalchemy import func, literal, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import opaque_registry.database.models as db_models
+from opaque_registry.api.errors.packages import (
+    PackageNotFoundError,
+    PackageVersionNotFoundError,
+)
+from opaque_registry.tracing import traced
+
+
+@traced()
+async def record_package_version_dependents(
+    db_session: AsyncSession,
+    package_id: str,
+    version: str,
+    shard_id: int,
+    dependencies: set[tuple[str, str]],
+    dependency_shard_ids: dict[str, int],
+):
+    """Add a new package version to the dependents of its dependencies and
+    of everything they depend on"""
+    if not dependencies:
+        return
+    await db_session.execute(
+        insert(db_models.PackageVersionDependent).values(
+            [
+                {
+                    "dependency": dependency,
+                    "dependency_version": dependency_version,
+                    "dependency_shard_id": dependency_shard_ids[dependency],
+                    "package_id": package_id,
+                    "version": version,
+                    "shard_id": shard_id,
+                    "depth": 1,
+                }
+                for dependency, dependency_version in dependencies
+            ]
+        )
+    )
+    # a new version has no dependents yet, its closure rows are derived
+    # from the closure rows of its direct dependencies
+    indirect_dependencies = (
+        select(
+            db_models.PackageVersionDependent.dependency,
+            db_models.PackageVersionDependent.dependency_version,
+            db_models.PackageVersionDependent.dependency_shard_id,
+            literal(package_id),
+            literal(version),
+            literal(shard_id),
+            func.min(db_models.PackageVersionDependent.depth) + 1,
+        )
+        .where(
+            tuple_(
+                db_models.PackageVersionDependent.package_id,
+                db_models.PackageVersionDependent.version,
+            ).in_(list(dependencies))
+        )
+        .group_by(
+            db_models.PackageVersionDependent.dependency,
+            db_models.PackageVersionDependent.dependency_version,
+            db_models.PackageVersionDependent.dependency_shard_id,
+        )
+    )
+    await db_session.execute(
+        insert(db_models.PackageVersionDependent).from_select(
+            [
+                "dependency",
+                "dependency_version",
+                "dependency_shard_id",
+                "package_id",
+                "version",
+                "shard_id",
+                "depth",
+            ],
+            indirect_dependencies,
+        )
+        # also a direct dependency, depth 1 is kept
+        .on_conflict_do_nothing()
+    )
+
+
+@traced()
+async def get_package_dependents(
+    db_session: AsyncSession,
+    package_id: str,
+    version: str | None,
+    transitive: bool,
+) -> list[db_models.PackageVersionDependent]:
+    # answered by a range scan of the package_version_dependent primary key
+    dependents_query = (
+        select(db_models.PackageVersionDependent)
+        .where(db_models.PackageVersionDependent.dependency == package_id)
+        .order_by(
+            db_models.PackageVersionDependent.depth,
+            db_models.PackageVersionDependent.package_id,
+            db_models.PackageVersionDependent.version,
+        )
+    )
+    if version is not None:
+        dependents_query = dependents_query.where(
+            db_models.PackageVersionDependent.dependency_version == version
+        )
+    if not transitive:
+        dependents_query = dependents_query.where(
+            db_models.PackageVersionDependent.depth == 1
+        )
+    dependents = (await db_session.execute(dependents_query)).scalars().all()
+    if not dependents:
+        # ensures the package or version exists before reporting no dependents
+        if await db_session.get(db_models.Package, package_id) is None:
+            raise PackageNotFoundError(package_id=package_id)
+        if (
+            version is not None
+            and await db_session.get(db_models.PackageVersion, (package_id, version))
+            is None
+        ):
+            raise PackageVersionNotFoundError(package_id=package_id, constraint=version)
+    return dependents
@@ -1,28 +1,52 @@
-from psycopg.errors import UniqueViolation
-from sqlalchemy import and_, select
-from sqlalchemy.exc import IntegrityError
+from semver import Version
+from sqlalchemy import (
+    Integer,
+    String,
+    and_,
+    bindparam,
+    func,
+    or_,
+    select,
+    true,
+    tuple_,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 
 import opaque_registry.database.models as db_models
+import opaque_registry.services.archive as archive_service
 from opaque_registry.api.errors.packages import (
+    InvalidVersionConstraintError,
     PackageAlreadyExistsError,
     PackageNotFoundError,
     PackageVersionAlreadyExistsError,
+    PackageVersionNotFoundError,
     PackageVersionNotYetPublished,
     SelfReferencingPackageError,
 )
+from opaque_registry.api.schemas.helpers.semver import (
+    VersionComparator,
+    parse_version_constraint,
+)
 from opaque_registry.api.schemas.package import NewPackage, NewPackageVersion
-from opaque_registry.async_tasks.shards.tasks import (
-    create_shard_task,
-    create_whole_index_task,
+from opaque_registry.async_tasks.dispatch import (
+    CREATE_SHARD_TASK,
+    CREATE_WHOLE_INDEX_TASK,
 )
-from opaque_registry.services.shards import (
-    derive_shard_id_from_package_id,
-    get_shard_count,
+from opaque_registry.async_tasks.outbox import enqueue_task
+from opaque_registry.services.dependents import record_package_version_dependents
+from opaque_registry.services.package_filter import (
+    PACKAGE_CREATED_CHANNEL,
+    package_id_filter,
 )
+from opaque_registry.services.shards import get_shard_count
+from opaque_registry.services.summary import record_new_package_version
+from opaque_registry.sharding import derive_shard_id_from_package_id
+from opaque_registry.tracing import traced
 
 
+@traced()
 async def get_all_packages(db_session: AsyncSession) -> list[db_models.Package]:
     result = await db_session.execute(
         select(db_models.Package).options(
@@ -32,9 +56,9 @@ async def get_all_packages(db_session: AsyncSession) -> list[db_models.Package]:
     return result.scalars().unique().all()
 
 
-async def get_package_by_id(
+async def _select_package(
     db_session: AsyncSession, package_id: str
-) -> db_models.Package | None:
+) -> db_models.Package:
     package_query = (
         select(db_models.Package)
         .where(db_models.Package.id == package_id)
@@ -46,13 +70,90 @@ async def get_package_by_id(
     return db_package
 
 
-async def get_package_versions(
+async def _ensure_package_might_exist(package_id: str):
+    # unknown ids are rejected without a query when the filter is enabled
+    if not await package_id_filter.might_exist(package_id):
+        raise PackageNotFoundError(package_id=package_id)
+
+
+@traced()
+async def get_package_by_id(
     db_session: AsyncSession, package_id: str
 ) -> db_models.Package | None:
+    await _ensure_package_might_exist(package_id)
+    return await _select_package(db_session=db_session, package_id=package_id)
+
+
+def _version_comparator_clause(package_id: str, comparator: VersionComparator):
+    # comparing (package_id, major, minor, patch) rows lets postgres use
+    # ix_package_version_semver as a range scan
+    version_row = tuple_(
+        db_models.PackageVersion.package_id,
+        db_models.PackageVersion.version_major,
+        db_models.PackageVersion.version_minor,
+        db_models.PackageVersion.version_patch,
+    )
+    bound_row = tuple_(package_id, comparator.major, comparator.minor, comparator.patch)
+    if comparator.operator == "==":
+        return and_(
+            version_row == bound_row,
+            db_models.PackageVersion.version_prerelease.is_(None)
+            if comparator.prerelease is None
+            else db_models.PackageVersion.version_prerelease == comparator.prerelease,
+        )
+    if comparator.operator == ">=":
+        return version_row >= bound_row
+    if comparator.operator == ">":
+        return version_row > bound_row
+    if comparator.operator == "<=":
+        return version_row <= bound_row
+    return version_row < bound_row
+
+
+def _package_versions_query(
+    package_id: str, constraint: str | None, include_prerelease: bool
+):
+    package_versions_query = select(db_models.PackageVersion).where(
+        db_models.PackageVersion.package_id == package_id
+    )
+    if constraint is not None:
+        try:
+            comparators = parse_version_constraint(constraint)
+        except ValueError as exc:
+            raise InvalidVersionConstraintError(
+                constraint=constraint, reason=str(exc)
+            ) from exc
+        package_versions_query = package_versions_query.where(
+            *(
+                _version_comparator_clause(package_id, comparator)
+                for comparator in comparators
+            )
+        )
+    if not include_prerelease:
+        package_versions_query = package_versions_query.where(
+            db_models.PackageVersion.version_prerelease.is_(None)
+        )
+    return package_versions_query
+
+
+@traced()
+async def get_package_versions(
+    db_session: AsyncSession,
+    package_id: str,
+    constraint: str | None = None,
+    include_prerelease: bool = True,
+) -> list[db_models.PackageVersion]:
     # ensures package exists
     package = await get_package_by_id(db_session=db_session, package_id=package_id)
-    package_versions_query = select(db_models.PackageVersion).where(
-        db_models.PackageVersion.package_id == package.id
+    package_versions_query = _package_versions_query(
+        package_id=package.id,
+        constraint=constraint,
+        include_prerelease=include_prerelease,
+    ).order_by(
+        db_models.PackageVersion.version_major,
+        db_models.PackageVersion.version_minor,
+        db_models.PackageVersion.version_patch,
+        db_models.PackageVersion.version_prerelease.asc().nulls_last(),
     )
     db_package_versions = (
         (await db_session.execute(package_versions_query)).scalars().all()
@@ -60,35 +161,164 @@ async def get_package_versions(
     return db_package_versions
 
 
-async def create_package(
+@traced()
+async def get_latest_package_version(
+    db_session: AsyncSession,
+    package_id: str,
+    constraint: str | None = None,
+    include_prerelease: bool = False,
+) -> db_models.PackageVersion:
+    await _ensure_package_might_exist(package_id)
+    latest_package_version_query = (
+        _package_versions_query(
+            package_id=package_id,
+            constraint=constraint,
+            include_prerelease=include_prerelease,
+        )
+        .order_by(
+            db_models.PackageVersion.version_major.desc(),
+            db_models.PackageVersion.version_minor.desc(),
+            db_models.PackageVersion.version_patch.desc(),
+            db_models.PackageVersion.version_prerelease.desc().nulls_first(),
+        )
+        .limit(1)
+    )
+    db_package_version = (
+        await db_session.execute(latest_package_version_query)
+    ).scalar_one_or_none()
+    if db_package_version is None:
+        # ensures package exists before reporting a missing version
+        await get_package_by_id(db_session=db_session, package_id=package_id)
+        raise PackageVersionNotFoundError(package_id=package_id, constraint=constraint)
+    return db_package_version
+
+
+def _package_matches(db_package: db_models.Package, package: NewPackage) -> bool:
+    return (
+        db_package.description == package.description
+        and db_package.meta == package.meta
+        and sorted(db_package.tags) == sorted(set(package.tags or []))
+    )
+
+
+@traced()
+async def put_package(
     db_session: AsyncSession, package: NewPackage
-) -> db_models.Package:
+) -> tuple[db_models.Package, bool]:
+    """Create the package unless it already exists, a single statement
+    inserts the package, its tags and its summary
+
+    :returns: the package and whether it was created
+    :raises PackageAlreadyExistsError: the package exists with other fields
+    """
     shard_id = derive_shard_id_from_package_id(
         package_id=package.id,
         shard_count=(await get_shard_count(db_session=db_session)),
     )
-    db_package = db_models.Package(id=package.id, shard_id=shard_id)
-    db_session.add(db_package)
-    try:
-        await db_session.flush()
-    except IntegrityError as exc:
-        # if isinstance(exc.orig, Non)
-        if exc.orig is not None and isinstance(exc.orig, UniqueViolation):
-            raise PackageAlreadyExistsError(package_id=package.id) from exc
-        raise exc
-    db_session.add_all(
-        [
-            db_models.PackageTag(package_id=db_package.id, tag=tag)
-            for tag in (package.tags or [])
-        ]
-    )
-    await db_session.refresh(db_package)
+    tags = sorted(set(package.tags or []))
+    inserted_package = (
+        insert(db_models.Package)
+        .values(
+            id=package.id,
+            description=package.description,
+            meta=package.meta,
+            shard_id=shard_id,
+        )
+        # no conflict target, the primary key includes the shard once the
+        # table is partitioned
+        .on_conflict_do_nothing()
+        .returning(
+            db_models.Package.id,
+            db_models.Package.description,
+            db_models.Package.shard_id,
+        )
+        .cte("inserted_package")
+    )
+    inserted_tags = (
+        insert(db_models.PackageTag)
+        .from_select(
+            ["package_id", "shard_id", "tag"],
+            select(
+                inserted_package.c.id,
+                inserted_package.c.shard_id,
+                func.unnest(bindparam("tags", tags, type_=ARRAY(String))),
+            ),
+        )
+        .cte("inserted_tags")
+    )
+    inserted_summary = (
+        insert(db_models.PackageSummary)
+        .from_select(
+            ["package_id", "shard_id", "description"],
+            select(
+                inserted_package.c.id,
+                inserted_package.c.shard_id,
+                inserted_package.c.description,
+            ),
+        )
+        .cte("inserted_summary")
+    )
+    created = (
+        await db_session.execute(
+            select(inserted_package.c.id).add_cte(inserted_tags, inserted_summary)
+        )
+    ).scalar_one_or_none() is not None
+    if created:
+        # delivered on commit, adds the package to the API package filters
+        await db_session.execute(
+            select(func.pg_notify(PACKAGE_CREATED_CHANNEL, package.id))
+        )
+        # the filter of this worker is updated before the response, a
+        # rolled back creation only leaves a false positive
+        package_id_filter.add(package.id)
+        db_package = db_models.Package(
+            id=package.id,
+            description=package.description,
+            meta=package.meta,
+            shard_id=shard_id,
+            tags_relationship=[
+                db_models.PackageTag(package_id=package.id, tag=tag, shard_id=shard_id)
+                for tag in tags
+            ],
+        )
+        return db_package, True
+    # the creation of the package may not be notified yet, the filter is not used
+    db_package = await _select_package(db_session=db_session, package_id=package.id)
+    if not _package_matches(db_package=db_package, package=package):
+        raise PackageAlreadyExistsError(package_id=package.id)
+    return db_package, False
+
+
+@traced()
+async def create_package(
+    db_session: AsyncSession, package: NewPackage
+) -> db_models.Package:
+    db_package, created = await put_package(db_session=db_session, package=package)
+    if not created:
+        raise PackageAlreadyExistsError(package_id=package.id)
     return db_package
 
 
-async def create_package_version(
+@traced()
+async def put_package_version(
     db_session: AsyncSession, package_id: str, package_version: NewPackageVersion
-) -> db_models.Package:
+) -> tuple[db_models.PackageVersion, bool]:
+    """Create the package version unless it already exists, the version and
+    its dependencies are inserted by a single statement
+
+    :returns: the package version and whether it was created
+    :raises PackageVersionAlreadyExistsError: the version exists with another
+        url or other dependencies
+    :raises ArchiveNotFoundError: the referenced archive was not uploaded
+    """
+    if package_version.archive is not None:
+        package_version = package_version.copy(
+            update={
+                "url": await archive_service.get_archive_url(
+                    sha256=package_version.archive
+                )
+            }
+        )
     # check if all dependencies are published
     # use in_ for optimization
     dependencies_where_clauses = [
@@ -99,16 +329,29 @@ async def create_package_version(
         for dependency in package_version.dependencies
     ]
     dependencies_versions_query = select(db_models.PackageVersion).where(
-        *dependencies_where_clauses
+        or_(*dependencies_where_clauses)
     )
     dependencies_versions = (
         ((await db_session.execute(dependencies_versions_query)).scalars().all())
         if dependencies_where_clauses
         else []
     )
-    # ensures package exists
-    _package = await get_package_by_id(db_session=db_session, package_id=package_id)
+    # ensures package exists, its stored shard is reused
+    shard_id = await db_session.scalar(
+        select(db_models.Package.shard_id).where(db_models.Package.id == package_id)
+    )
+    if shard_id is None:
+        raise PackageNotFoundError(package_id=package_id)
 
+    found_dependencies = {
+        (dependency_version.package_id, dependency_version.version)
+        for dependency_version in dependencies_versions
+    }
+    for dependency in package_version.dependencies:
+        if (dependency.package_id, dependency.version) not in found_dependencies:
+            raise PackageVersionNotFoundError(
+                package_id=dependency.package_id, constraint=dependency.version
+            )
     for dependency_version in dependencies_versions:
         if dependency_version.package_id == package_id:
             raise SelfReferencingPackageError(
@@ -122,22 +365,158 @@ async def create_package_version(
                 package_version=dependency_version.version,
             )
 
+    dependencies = {
+        (dependency.package_id, dependency.version)
+        for dependency in package_version.dependencies
+    }
+    dependency_shard_ids = {
+        dependency_version.package_id: dependency_version.shard_id
+        for dependency_version in dependencies_versions
+    }
+    parsed_version = Version.parse(package_version.version)
+    inserted_version = (
+        insert(db_models.PackageVersion)
+        .values(
+            package_id=package_id,
+            version=package_version.version,
+            url=package_version.url,
+            version_major=parsed_version.major,
+            version_minor=parsed_version.minor,
+            version_patch=parsed_version.patch,
+            version_prerelease=parsed_version.prerelease,
+            shard_id=shard_id,
+        )
+        .on_conflict_do_nothing()
+        .returning(
+            db_models.PackageVersion.package_id,
+            db_models.PackageVersion.version,
+            db_models.PackageVersion.shard_id,
+        )
+        .cte("inserted_version")
+    )
+    new_dependencies = (
+        func.unnest(
+            bindparam(
+                "dependencies",
+                [dependency for dependency, _ in dependencies],
+                type_=ARRAY(String),
+            ),
+            bindparam(
+                "dependencies_versions",
+                [dependency_version for _, dependency_version in dependencies],
+                type_=ARRAY(String),
+            ),
+            bindparam(
+                "dependencies_shard_ids",
+                [dependency_shard_ids[dependency] for dependency, _ in dependencies],
+                type_=ARRAY(Integer),
+            ),
+        )
+        .table_valued("dependency", "dependency_version", "dependency_shard_id")
+        .render_derived(name="new_dependency")
+    )
+    inserted_dependencies = (
+        insert(db_models.PackageVersionDependency)
+        .from_select(
+            [
+                "package_id",
+                "version",
+                "shard_id",
+                "dependency",
+                "dependency_version",
+                "dependency_shard_id",
+            ],
+            select(
+                inserted_version.c.package_id,
+                inserted_version.c.version,
+                inserted_version.c.shard_id,
+                new_dependencies.c.dependency,
+                new_dependencies.c.dependency_version,
+                new_dependencies.c.dependency_shard_id,
+            ).join(new_dependencies, true()),
+        )
+        .cte("inserted_dependencies")
+    )
+    created = (
+        await db_session.execute(
+            select(inserted_version.c.version).add_cte(inserted_dependencies)
+        )
+    ).scalar_one_or_none() is not None
+    if not created:
+        return (
+            await _get_matching_package_version(
+                db_session=db_session,
+                package_id=package_id,
+                package_version=package_version,
+                dependencies=dependencies,
+            ),
+            False,
+        )
+
+    await record_new_package_version(
+        db_session=db_session,
+        package_id=package_id,
+        dependencies={dependency for dependency, _ in dependencies},
+    )
+    await record_package_version_dependents(
+        db_session=db_session,
+        package_id=package_id,
+        version=package_version.version,
+        shard_id=shard_id,
+        dependencies=dependencies,
+        dependency_shard_ids=dependency_shard_ids,
+    )
+    # sent to the broker once this transaction is committed
+    await enqueue_task(
+        db_session=db_session, task_name=CREATE_SHARD_TASK, shard_id=shard_id
+    )
+    await enqueue_task(db_session=db_session, task_name=CREATE_WHOLE_INDEX_TASK)
     db_package_version = db_models.PackageVersion(
-        package_id=package_id, version=package_version.version, url=package_version.url
-    )
-    db_session.add(db_package_version)
-    try:
-        await db_session.flush()
-    except IntegrityError as exc:
-        if exc.orig is not None and isinstance(exc.orig, UniqueViolation):
-            raise PackageVersionAlreadyExistsError(
-                package_id=package_id, package_version=package_version.version
-            ) from exc
-        raise exc
-    shard_id = derive_shard_id_from_package_id(
         package_id=package_id,
-        shard_count=(await get_shard_count(db_session=db_session)),
+        version=package_version.version,
+        url=package_version.url,
+        published=False,
+        shard_id=shard_id,
     )
-    create_shard_task.delay(shard_id=shard_id)
-    create_whole_index_task.delay()
+    return db_package_version, True
+
+
+async def _get_matching_package_version(
+    db_session: AsyncSession,
+    package_id: str,
+    package_version: NewPackageVersion,
+    dependencies: set[tuple[str, str]],
+) -> db_models.PackageVersion:
+    db_package_version = await db_session.get(
+        db_models.PackageVersion, (package_id, package_version.version)
+    )
+    db_dependencies = await db_session.execute(
+        select(
+            db_models.PackageVersionDependency.dependency,
+            db_models.PackageVersionDependency.dependency_version,
+        ).where(
+            db_models.PackageVersionDependency.package_id == package_id,
+            db_models.PackageVersionDependency.version == package_version.version,
+        )
+    )
+    if db_package_version.url != package_version.url or dependencies != {
+        tuple(db_dependency) for db_dependency in db_dependencies
+    }:
+        raise PackageVersionAlreadyExistsError(
+            package_id=package_id, package_version=package_version.version
+        )
+    return db_package_version
+
+
+@traced()
+async def create_package_version(
+    db_session: AsyncSession, package_id: str, package_version: NewPackageVersion
+) -> db_models.PackageVersion:
+    db_package_version, created = await put_package_version(
+        db_session=db_session, package_id=package_id, package_version=package_version
+    )
+    if not created:
+        raise PackageVersionAlreadyExistsError(
+            package_id=package_id, package_version=package_version.version
+        )
     return db_package_version
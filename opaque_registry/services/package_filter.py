@@ -0,0 +1,139 @@
+"""Bloom filter of the package ids held by each API worker
+
+With ``OPAQUE_REGISTRY_PACKAGE_FILTER=1``, lookups of unknown package ids
+are answered without querying the database. The filter is built from the
+package ids once the worker listens to the ``package_created``
+notifications, created packages are then added as they are notified, and it
+is built again whenever notifications may have been missed. Until built,
+every package id is looked up in the database.
+
+A package created by another worker may be missing from the filter until
+its notification is received: a miss is only trusted once the notifications
+committed before it are received. The misses of a worker share its sync
+notifications, one is in flight at a time and no pooled connection is used
+(see ``NotificationListener.sync``).
+
+Clients use the filter published with the index instead (see
+``opaque_registry.existence_filter``).
+"""
+import asyncio
+import logging
+import os
+
+from sqlalchemy import func, select
+
+import opaque_registry.database.models as db_models
+from opaque_registry.database.connector import create_async_db_sessionmaker
+from opaque_registry.database.notifications import NotificationListener
+from opaque_registry.existence_filter import BloomFilter, package_key
+
+logger = logging.getLogger(__name__)
+
+PACKAGE_FILTER_ENABLED = os.getenv("OPAQUE_REGISTRY_PACKAGE_FILTER", "0") == "1"
+PACKAGE_CREATED_CHANNEL = "package_created"
+# packages which can be added before the filter is built again
+PACKAGE_FILTER_HEADROOM = 1024
+REBUILD_RETRY_DELAY = 5
+
+
+class PackageIdFilter:
+    def __init__(self):
+        self._bloom_filter = None
+        self._capacity_left = 0
+        # packages notified while the filter is being built
+        self._created_during_build = None
+        self._build_task = None
+        # incremented when notifications may have been missed
+        self._resets = 0
+
+    def _might_contain(self, package_id: str) -> bool:
+        return (
+            self._bloom_filter is None or package_key(package_id) in self._bloom_filter
+        )
+
+    async def might_exist(self, package_id: str) -> bool:
+        if self._might_contain(package_id):
+            return True
+        if not package_created_listener.connected:
+            return True
+        try:
+            await package_created_listener.sync()
+        except asyncio.TimeoutError:
+            return True
+        return self._might_contain(package_id)
+
+    def add(self, package_id: str):
+        """Add a package created by this worker, its notification is received
+        after the response"""
+        if self._created_during_build is not None:
+            self._created_during_build.add(package_id)
+        if self._bloom_filter is not None:
+            self._bloom_filter.add(package_key(package_id))
+
+    def on_package_created(self, package_id: str | None):
+        if package_id is None:
+            # notifications may have been missed, the filter can't be trusted
+            self._bloom_filter = None
+            self._resets += 1
+            self._schedule_build()
+            return
+        if self._created_during_build is not None:
+            self._created_during_build.add(package_id)
+        if self._bloom_filter is not None:
+            self._bloom_filter.add(package_key(package_id))
+            self._capacity_left -= 1
+            if self._capacity_left <= 0:
+                self._schedule_build()
+
+    def _schedule_build(self):
+        if self._build_task is None or self._build_task.done():
+            self._build_task = asyncio.create_task(self._build_until_done())
+
+    async def _build_until_done(self):
+        while True:
+            try:
+                if await self.build():
+                    return
+            except Exception:
+                logger.exception(
+                    f"[PackageFilter] build failed, retrying in {REBUILD_RETRY_DELAY}s"
+                )
+                await asyncio.sleep(REBUILD_RETRY_DELAY)
+
+    async def build(self) -> bool:
+        """:returns: False if notifications were missed meanwhile, the filter
+        is not replaced"""
+        resets = self._resets
+        created_during_build = self._created_during_build = set()
+        try:
+            async with create_async_db_sessionmaker()() as db_session:
+                package_count = await db_session.scalar(
+                    select(func.count()).select_from(db_models.Package)
+                )
+                capacity = package_count * 2 + PACKAGE_FILTER_HEADROOM
+                bloom_filter = BloomFilter.for_capacity(capacity)
+                async for package_id in await db_session.stream_scalars(
+                    select(db_models.Package.id)
+                ):
+                    bloom_filter.add(package_key(package_id))
+            if resets != self._resets:
+                return False
+            for package_id in created_during_build:
+                bloom_filter.add(package_key(package_id))
+            self._bloom_filter = bloom_filter
+            self._capacity_left = capacity - package_count - len(created_during_build)
+        finally:
+            self._created_during_build = None
+        logger.info(f"[PackageFilter] built from {package_count} packages")
+        return True
+
+    async def stop(self):
+        if self._build_task is not None:
+            self._build_task.cancel()
+            await asyncio.gather(self._build_task, return_exceptions=True)
+
+
+package_id_filter = PackageIdFilter()
+package_created_listener = NotificationListener(
+    channel=PACKAGE_CREATED_CHANNEL, on_notify=package_id_filter.on_package_created
+)
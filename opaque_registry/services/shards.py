@@ -1,22 +1,210 @@
-import hashlib
+import asyncio
+import os
+import time
 
-from sqlalchemy import func, select
+from sqlalchemy import distinct, func, select, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import opaque_registry.database.models as db_models
+from opaque_registry.database.connector import create_async_db_sessionmaker
+from opaque_registry.database.notifications import NotificationListener
+from opaque_registry.tracing import traced
 
+SHARD_CHANGES_CHANNEL = "shard_changes"
+# transaction-level advisory lock taken to record a shard change, held until
+# commit the change ids (feed cursors) are committed in increasing order
+SHARD_CHANGES_LOCK_KEY = 0x5348415244
+# upper bound of a wait when notifications are missed or the listener is down
+SHARD_CHANGES_POLL_INTERVAL = float(
+    os.getenv("OPAQUE_REGISTRY_SHARD_CHANGES_POLL_INTERVAL", "5")
+)
 
-def derive_shard_id_from_package_id(package_id: str, shard_count: int) -> int:
-    # use sha256 to get a 256 bit hash of the package_id
-    # then convert that to an integer
-    # then modulo that integer by the number of shards
+shard_changes_listener = NotificationListener(channel=SHARD_CHANGES_CHANNEL)
 
-    package_id_bytes = package_id.encode("utf-8")
-    package_id_hash = hashlib.sha256(package_id_bytes).digest()
-    package_id_int = int.from_bytes(package_id_hash, "big")
-    shard_id = package_id_int % shard_count
-    return shard_id
+
+_shard_count = None
 
 
 async def get_shard_count(db_session: AsyncSession) -> int:
-    return await db_session.scalar(select(func.count()).select_from(db_models.Shard))
+    # shards are only created when deploying the registry, the count is
+    # read once per process
+    global _shard_count
+    if not _shard_count:
+        _shard_count = await db_session.scalar(
+            select(func.count()).select_from(db_models.Shard)
+        )
+    return _shard_count
+
+
+@traced()
+async def get_all_shards(db_session: AsyncSession) -> list[db_models.Shard]:
+    return (
+        (await db_session.execute(select(db_models.Shard).order_by(db_models.Shard.id)))
+        .scalars()
+        .all()
+    )
+
+
+async def get_all_shard_ids(db_session: AsyncSession) -> list[int]:
+    return (
+        (
+            await db_session.execute(
+                select(db_models.Shard.id).order_by(db_models.Shard.id)
+            )
+        )
+        .scalars()
+        .all()
+    )
+
+
+async def get_pending_shard_ids(db_session: AsyncSession) -> list[int]:
+    """Shards with versions not published by any generation yet"""
+    return (
+        (
+            await db_session.execute(
+                select(distinct(db_models.PackageVersion.shard_id))
+                .join(db_models.Package)
+                .where(
+                    db_models.Package.meta == False,
+                    db_models.PackageVersion.published == False,
+                )
+                .order_by(db_models.PackageVersion.shard_id)
+            )
+        )
+        .scalars()
+        .all()
+    )
+
+
+async def get_unfinished_shard_rebuild(
+    db_session: AsyncSession,
+) -> db_models.ShardRebuild | None:
+    return await db_session.scalar(
+        select(db_models.ShardRebuild)
+        .where(db_models.ShardRebuild.finished_at.is_(None))
+        .order_by(db_models.ShardRebuild.id.desc())
+        .limit(1)
+    )
+
+
+async def start_shard_rebuild(db_session: AsyncSession) -> db_models.ShardRebuild:
+    shard_rebuild = db_models.ShardRebuild()
+    db_session.add(shard_rebuild)
+    await db_session.flush()
+    await db_session.refresh(shard_rebuild)
+    return shard_rebuild
+
+
+async def get_rebuilt_shard_ids(
+    db_session: AsyncSession, shard_rebuild: db_models.ShardRebuild
+) -> set[int]:
+    """Shards with a generation published since the rebuild started"""
+    return set(
+        (
+            await db_session.execute(
+                select(distinct(db_models.ShardChange.shard_id)).where(
+                    db_models.ShardChange.created_at >= shard_rebuild.started_at
+                )
+            )
+        )
+        .scalars()
+        .all()
+    )
+
+
+async def finish_shard_rebuild(
+    db_session: AsyncSession, shard_rebuild: db_models.ShardRebuild
+):
+    await db_session.execute(
+        update(db_models.ShardRebuild)
+        .where(db_models.ShardRebuild.id == shard_rebuild.id)
+        .values(finished_at=func.now())
+    )
+
+
+@traced()
+async def get_shard_changes(
+    db_session: AsyncSession, since: int, limit: int
+) -> list[dict]:
+    """Shard generations published after the ``since`` cursor, with the
+    package versions they published"""
+    shard_changes = (
+        (
+            await db_session.execute(
+                select(db_models.ShardChange)
+                .where(db_models.ShardChange.id > since)
+                .order_by(db_models.ShardChange.id)
+                .limit(limit)
+            )
+        )
+        .scalars()
+        .all()
+    )
+    if not shard_changes:
+        return []
+    changed_versions = {
+        (shard_change.shard_id, shard_change.generation): []
+        for shard_change in shard_changes
+    }
+    db_package_versions = await db_session.execute(
+        select(
+            db_models.Package.shard_id,
+            db_models.PackageVersion.published_generation,
+            db_models.PackageVersion.package_id,
+            db_models.PackageVersion.version,
+            db_models.PackageVersion.url,
+        )
+        .join(db_models.Package)
+        .where(
+            tuple_(
+                db_models.Package.shard_id,
+                db_models.PackageVersion.published_generation,
+            ).in_(list(changed_versions)),
+            db_models.Package.meta == False,
+        )
+        .order_by(db_models.PackageVersion.package_id)
+    )
+    for shard_id, generation, package_id, version, url in db_package_versions:
+        changed_versions[(shard_id, generation)].append(
+            {"package_id": package_id, "version": version, "url": url}
+        )
+    return [
+        {
+            "cursor": shard_change.id,
+            "shard_id": shard_change.shard_id,
+            "generation": shard_change.generation,
+            "location": shard_change.location,
+            "published_at": shard_change.created_at,
+            "versions": changed_versions[
+                (shard_change.shard_id, shard_change.generation)
+            ],
+        }
+        for shard_change in shard_changes
+    ]
+
+
+async def wait_for_shard_changes(since: int, limit: int, timeout: float) -> list[dict]:
+    """Long-poll the shard changes after the ``since`` cursor
+
+    A short-lived session is opened for each check, no connection is held
+    while waiting for a notification.
+    """
+    async_sessionmaker = create_async_db_sessionmaker()
+    deadline = time.monotonic() + timeout
+    while True:
+        # retrieved before querying, a change committed meanwhile sets it
+        change_event = shard_changes_listener.current_event()
+        async with async_sessionmaker() as db_session:
+            shard_changes = await get_shard_changes(
+                db_session=db_session, since=since, limit=limit
+            )
+        remaining = deadline - time.monotonic()
+        if shard_changes or remaining <= 0:
+            return shard_changes
+        try:
+            await asyncio.wait_for(
+                change_event.wait(),
+                timeout=min(remaining, SHARD_CHANGES_POLL_INTERVAL),
+            )
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,290 @@
+"""In-memory snapshot of the published registry, serving the package reads
+
+With ``OPAQUE_REGISTRY_SNAPSHOT=1`` each API worker loads the published
+shard artifacts into a read-only snapshot, along with the package metadata
+which artifacts do not carry, and ``GET /packages*`` are answered from it
+without querying the database.
+
+The snapshot is rebuilt when a shard change is notified, only the shards
+whose generation changed are downloaded again, and at least every
+``OPAQUE_REGISTRY_SNAPSHOT_REFRESH_INTERVAL`` seconds for packages created
+or edited without a new publication. A new snapshot replaces the previous
+one as a whole, a request always reads a consistent one.
+
+Unlike the database reads, only published versions are served, versions of
+meta packages are never published.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+from contextlib import suppress
+
+from semver import Version
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import opaque_registry.database.models as db_models
+import opaque_registry.services.shards as shards_service
+from opaque_registry.api.errors.packages import (
+    InvalidVersionConstraintError,
+    PackageNotFoundError,
+    PackageVersionNotFoundError,
+)
+from opaque_registry.api.schemas.helpers.semver import (
+    VersionComparator,
+    parse_version_constraint,
+)
+from opaque_registry.database.connector import create_async_db_sessionmaker
+from opaque_registry.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_ENABLED = os.getenv("OPAQUE_REGISTRY_SNAPSHOT", "0") == "1"
+SNAPSHOT_REFRESH_INTERVAL = float(
+    os.getenv("OPAQUE_REGISTRY_SNAPSHOT_REFRESH_INTERVAL", "30")
+)
+
+
+class SnapshotVersion:
+    __slots__ = ("version", "url", "major", "minor", "patch", "prerelease")
+
+    def __init__(self, version: str, url: str):
+        parsed_version = Version.parse(version)
+        # identical version strings are shared by every package
+        self.version = sys.intern(version)
+        self.url = url
+        self.major = parsed_version.major
+        self.minor = parsed_version.minor
+        self.patch = parsed_version.patch
+        self.prerelease = parsed_version.prerelease
+
+    def sort_key(self) -> tuple:
+        # same order as the database: prereleases lexically, before the release
+        return (
+            self.major,
+            self.minor,
+            self.patch,
+            self.prerelease is None,
+            self.prerelease or "",
+        )
+
+    def matches(self, comparator: VersionComparator) -> bool:
+        version_row = (self.major, self.minor, self.patch)
+        bound_row = (comparator.major, comparator.minor, comparator.patch)
+        if comparator.operator == "==":
+            return version_row == bound_row and self.prerelease == comparator.prerelease
+        if comparator.operator == ">=":
+            return version_row >= bound_row
+        if comparator.operator == ">":
+            return version_row > bound_row
+        if comparator.operator == "<=":
+            return version_row <= bound_row
+        return version_row < bound_row
+
+
+class SnapshotPackage:
+    __slots__ = ("id", "description", "tags", "meta", "versions")
+
+    def __init__(
+        self,
+        id: str,
+        description: str | None,
+        tags: tuple[str, ...],
+        meta: bool,
+        versions: tuple[SnapshotVersion, ...],
+    ):
+        self.id = id
+        self.description = description
+        self.tags = tags
+        self.meta = meta
+        # sorted by version
+        self.versions = versions
+
+
+class RegistrySnapshot:
+    __slots__ = ("shard_locations", "shard_versions", "packages", "_packages_json")
+
+    def __init__(
+        self,
+        shard_locations: dict[int, str],
+        shard_versions: dict[int, dict[str, tuple[SnapshotVersion, ...]]],
+        packages: dict[str, SnapshotPackage],
+    ):
+        self.shard_locations = shard_locations
+        # shard_id -> package_id -> versions, reused by the next snapshot
+        # for the shards which did not change
+        self.shard_versions = shard_versions
+        self.packages = packages
+        self._packages_json = None
+
+    def packages_json(self) -> bytes:
+        """``PackageList`` response, serialized once per snapshot"""
+        if self._packages_json is None:
+            self._packages_json = json.dumps(
+                {
+                    "packages": [
+                        {
+                            "id": package.id,
+                            "description": package.description,
+                            "tags": list(package.tags),
+                            "meta": package.meta,
+                        }
+                        for package in self.packages.values()
+                    ]
+                },
+                separators=(",", ":"),
+            ).encode()
+        return self._packages_json
+
+
+_snapshot: RegistrySnapshot | None = None
+
+
+def get_snapshot() -> RegistrySnapshot:
+    if _snapshot is None:
+        raise RuntimeError("the registry snapshot is not loaded")
+    return _snapshot
+
+
+def _load_shard_versions(location: str) -> dict[str, tuple[SnapshotVersion, ...]]:
+    # imported in snapshot mode only, like the artifact storage
+    from opaque_registry.artifacts import unpack_artifact
+    from opaque_registry.storage import read_artifact
+
+    shard_packages = unpack_artifact(read_artifact(location))
+    return {
+        sys.intern(package_id): tuple(
+            sorted(
+                (
+                    SnapshotVersion(version_entry["version"], version_entry["url"])
+                    for version_entry in version_entries
+                ),
+                key=SnapshotVersion.sort_key,
+            )
+        )
+        for package_id, version_entries in shard_packages.items()
+    }
+
+
+async def _get_packages_metadata(db_session: AsyncSession):
+    tags = (
+        select(func.array_agg(db_models.PackageTag.tag))
+        .where(db_models.PackageTag.package_id == db_models.Package.id)
+        .scalar_subquery()
+    )
+    return await db_session.execute(
+        select(
+            db_models.Package.id,
+            db_models.Package.description,
+            db_models.Package.meta,
+            db_models.Package.shard_id,
+            tags,
+        ).order_by(db_models.Package.id)
+    )
+
+
+@traced()
+async def refresh_snapshot():
+    """Build a new snapshot and swap it in, only changed shards are loaded"""
+    global _snapshot
+    previous_snapshot = _snapshot
+    async with create_async_db_sessionmaker()() as db_session:
+        shards = await shards_service.get_all_shards(db_session=db_session)
+        packages_metadata = (await _get_packages_metadata(db_session=db_session)).all()
+    shard_locations = {shard.id: shard.location for shard in shards if shard.location}
+    shard_versions = {}
+    changed_locations = {}
+    for shard_id, location in shard_locations.items():
+        if (
+            previous_snapshot is not None
+            and previous_snapshot.shard_locations.get(shard_id) == location
+        ):
+            shard_versions[shard_id] = previous_snapshot.shard_versions[shard_id]
+        else:
+            changed_locations[shard_id] = location
+    loaded_shard_versions = await asyncio.gather(
+        *(
+            asyncio.to_thread(_load_shard_versions, location)
+            for location in changed_locations.values()
+        )
+    )
+    shard_versions.update(zip(changed_locations, loaded_shard_versions))
+    packages = {}
+    for package_id, description, meta, shard_id, tags in packages_metadata:
+        package_id = sys.intern(package_id)
+        packages[package_id] = SnapshotPackage(
+            id=package_id,
+            description=description,
+            tags=tuple(sys.intern(tag) for tag in tags or ()),
+            meta=meta,
+            versions=shard_versions.get(shard_id, {}).get(package_id, ()),
+        )
+    _snapshot = RegistrySnapshot(
+        shard_locations=shard_locations,
+        shard_versions=shard_versions,
+        packages=packages,
+    )
+    if changed_locations:
+        logger.info(
+            f"[Snapshot] loaded shards {sorted(changed_locations)}, "
+            f"{len(packages)} packages"
+        )
+
+
+async def run_snapshot_refresher():
+    while True:
+        # retrieved before refreshing, a change published meanwhile sets it
+        change_event = shards_service.shard_changes_listener.current_event()
+        try:
+            await refresh_snapshot()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("[Snapshot] failed to refresh snapshot, retrying")
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(
+                change_event.wait(), timeout=SNAPSHOT_REFRESH_INTERVAL
+            )
+
+
+def get_package_by_id(package_id: str) -> SnapshotPackage:
+    package = get_snapshot().packages.get(package_id)
+    if package is None:
+        raise PackageNotFoundError(package_id=package_id)
+    return package
+
+
+def get_package_versions(
+    package_id: str, constraint: str | None = None, include_prerelease: bool = True
+) -> list[SnapshotVersion]:
+    package_versions = get_package_by_id(package_id=package_id).versions
+    if constraint is not None:
+        try:
+            comparators = parse_version_constraint(constraint)
+        except ValueError as exc:
+            raise InvalidVersionConstraintError(
+                constraint=constraint, reason=str(exc)
+            ) from exc
+    else:
+        comparators = []
+    return [
+        package_version
+        for package_version in package_versions
+        if (include_prerelease or package_version.prerelease is None)
+        and all(package_version.matches(comparator) for comparator in comparators)
+    ]
+
+
+def get_latest_package_version(
+    package_id: str, constraint: str | None = None, include_prerelease: bool = False
+) -> SnapshotVersion:
+    package_versions = get_package_versions(
+        package_id=package_id,
+        constraint=constraint,
+        include_prerelease=include_prerelease,
+    )
+    if not package_versions:
+        raise PackageVersionNotFoundError(package_id=package_id, constraint=constraint)
+    return package_versions[-1]
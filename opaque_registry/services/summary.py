@@ -0,0 +1,76 @@
+from enum import Enum
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import opaque_registry.database.models as db_models
+from opaque_registry.tracing import traced
+
+
+class PackageSummarySort(str, Enum):
+    recent = "recent"
+    popular = "popular"
+
+
+@traced()
+async def record_new_package_version(
+    db_session: AsyncSession, package_id: str, dependencies: set[str]
+):
+    # highest stable version, resolved through ix_package_version_semver
+    latest_version = (
+        select(db_models.PackageVersion.version)
+        .where(
+            db_models.PackageVersion.package_id == package_id,
+            db_models.PackageVersion.version_prerelease.is_(None),
+        )
+        .order_by(
+            db_models.PackageVersion.version_major.desc(),
+            db_models.PackageVersion.version_minor.desc(),
+            db_models.PackageVersion.version_patch.desc(),
+        )
+        .limit(1)
+        .scalar_subquery()
+    )
+    # rows are locked in a fixed order before being updated, concurrent
+    # versions of packages depending on each other would deadlock otherwise
+    await db_session.execute(
+        select(db_models.PackageSummary.package_id)
+        .where(db_models.PackageSummary.package_id.in_({package_id, *dependencies}))
+        .order_by(db_models.PackageSummary.package_id)
+        .with_for_update()
+    )
+    await db_session.execute(
+        update(db_models.PackageSummary)
+        .where(db_models.PackageSummary.package_id == package_id)
+        .values(
+            latest_version=latest_version,
+            version_count=db_models.PackageSummary.version_count + 1,
+            last_version_at=func.now(),
+        )
+    )
+    if dependencies:
+        await db_session.execute(
+            update(db_models.PackageSummary)
+            .where(db_models.PackageSummary.package_id.in_(dependencies))
+            .values(dependent_count=db_models.PackageSummary.dependent_count + 1)
+        )
+
+
+@traced()
+async def get_package_summaries(
+    db_session: AsyncSession, sort: PackageSummarySort, limit: int, offset: int
+) -> list[db_models.PackageSummary]:
+    if sort == PackageSummarySort.popular:
+        order_by = (
+            db_models.PackageSummary.dependent_count.desc(),
+            db_models.PackageSummary.package_id,
+        )
+    else:
+        order_by = (
+            db_models.PackageSummary.last_published_at.desc().nulls_last(),
+            db_models.PackageSummary.package_id,
+        )
+    result = await db_session.execute(
+        select(db_models.PackageSummary).order_by(*order_by).limit(limit).offset(offset)
+    )
+    return result.scalars().all()
@@ -0,0 +1,14 @@
+"""Package to shard assignment, shared by the registry and its clients"""
+import hashlib
+
+
+def derive_shard_id_from_package_id(package_id: str, shard_count: int) -> int:
+    # use sha256 to get a 256 bit hash of the package_id
+    # then convert that to an integer
+    # then modulo that integer by the number of shards
+
+    package_id_bytes = package_id.encode("utf-8")
+    package_id_hash = hashlib.sha256(package_id_bytes).digest()
+    package_id_int = int.from_bytes(package_id_hash, "big")
+    shard_id = package_id_int % shard_count
+    return shard_id
@@ -0,0 +1,256 @@
+"""Storage of the shard and index artifacts, and of the package archives
+
+``OPAQUE_REGISTRY_STORAGE`` selects the backend:
+
+- ``s3`` (default): artifacts are uploaded to the DigitalOcean Spaces bucket
+  and served by its CDN
+- ``local``: artifacts are written to ``OPAQUE_REGISTRY_LOCAL_STORAGE_DIR``
+  and served under ``OPAQUE_REGISTRY_LOCAL_STORAGE_URL``, by the API itself
+  when the URL is a path
+"""
+
+import os
+import tempfile
+import urllib.request
+from pathlib import Path
+
+from opaque_registry.tracing import traced
+
+STORAGE_BACKEND = os.getenv("OPAQUE_REGISTRY_STORAGE", "s3")
+LOCAL_STORAGE_DIR = os.getenv("OPAQUE_REGISTRY_LOCAL_STORAGE_DIR", "artifacts")
+LOCAL_STORAGE_URL = os.getenv("OPAQUE_REGISTRY_LOCAL_STORAGE_URL", "/artifacts")
+
+OBJECT_STORAGE_REGION = os.getenv("OBJECT_STORAGE_REGION", "fra1")
+OBJECT_STORAGE_BUCKET = os.getenv("OBJECT_STORAGE_BUCKET", "obengine-packages")
+OBJECT_STORAGE_KEY = os.getenv("OBJECT_STORAGE_KEY")
+OBJECT_STORAGE_SECRET = os.getenv("OBJECT_STORAGE_SECRET")
+
+# parts of a multipart upload must be at least 5 MiB, except the last one
+MULTIPART_PART_SIZE = max(
+    int(os.getenv("OPAQUE_REGISTRY_MULTIPART_PART_SIZE", str(8 * 1024 * 1024))),
+    5 * 1024 * 1024,
+)
+
+
+def get_s3_config():
+    return {
+        "region_name": OBJECT_STORAGE_REGION,
+        "endpoint_url": "https://{}.digitaloceanspaces.com".format(
+            OBJECT_STORAGE_REGION
+        ),
+        "aws_access_key_id": OBJECT_STORAGE_KEY,
+        "aws_secret_access_key": OBJECT_STORAGE_SECRET,
+    }
+
+
+def get_s3_client():
+    if OBJECT_STORAGE_KEY is None or OBJECT_STORAGE_SECRET is None:
+        raise RuntimeError(
+            "OBJECT_STORAGE_KEY or OBJECT_STORAGE_SECRET environment variables are not set"
+        )
+    # imported on first upload, the local backend does not need it
+    import boto3
+
+    return boto3.client("s3", **get_s3_config())
+
+
+@traced("storage.upload")
+def upload_to_s3(data: bytes, key: str):
+    get_s3_client().put_object(
+        Bucket=OBJECT_STORAGE_BUCKET, Key=key, Body=data, ACL="public-read"
+    )
+    return get_object_url(key)
+
+
+def get_object_url(key: str) -> str:
+    return f"https://{OBJECT_STORAGE_BUCKET}.{OBJECT_STORAGE_REGION}.cdn.digitaloceanspaces.com/{key}"
+
+
+class MultipartUpload:
+    """Uploads an object in fixed-size parts while it is being written, at
+    most one part is held in memory
+
+    The upload is completed when leaving the ``with`` block and aborted if
+    an exception is raised.
+    """
+
+    def __init__(self, key: str, part_size: int = MULTIPART_PART_SIZE):
+        self.key = key
+        self.part_size = part_size
+        self.size = 0
+        self._buffer = bytearray()
+        self._parts = []
+        self._upload_id = None
+        self._s3client = None
+
+    def __enter__(self):
+        self._s3client = get_s3_client()
+        self._upload_id = self._s3client.create_multipart_upload(
+            Bucket=OBJECT_STORAGE_BUCKET, Key=self.key, ACL="public-read"
+        )["UploadId"]
+        return self
+
+    def write(self, data: bytes):
+        self._buffer += data
+        self.size += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(self._buffer[: self.part_size])
+            del self._buffer[: self.part_size]
+
+    @traced("storage.upload_part")
+    def _upload_part(self, data: bytes):
+        part_number = len(self._parts) + 1
+        response = self._s3client.upload_part(
+            Bucket=OBJECT_STORAGE_BUCKET,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=bytes(data),
+        )
+        self._parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self._s3client.abort_multipart_upload(
+                Bucket=OBJECT_STORAGE_BUCKET, Key=self.key, UploadId=self._upload_id
+            )
+            return
+        if self._buffer or not self._parts:
+            self._upload_part(self._buffer)
+            self._buffer.clear()
+        self._s3client.complete_multipart_upload(
+            Bucket=OBJECT_STORAGE_BUCKET,
+            Key=self.key,
+            UploadId=self._upload_id,
+            MultipartUpload={"Parts": self._parts},
+        )
+
+    @property
+    def url(self) -> str:
+        return get_object_url(self.key)
+
+
+class LocalUpload:
+    """Writes an artifact to the local storage directory, it only becomes
+    visible once complete"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.size = 0
+        self._path = Path(LOCAL_STORAGE_DIR) / key
+        self._file = None
+
+    def __enter__(self):
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = tempfile.NamedTemporaryFile(
+            dir=self._path.parent, prefix=f".{self._path.name}.", delete=False
+        )
+        return self
+
+    def write(self, data: bytes):
+        self._file.write(data)
+        self.size += len(data)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._file.close()
+        if exc_type is not None:
+            os.unlink(self._file.name)
+            return
+        os.replace(self._file.name, self._path)
+
+    @property
+    def url(self) -> str:
+        return get_artifact_url(self.key)
+
+
+def get_artifact_url(key: str) -> str:
+    """URL an artifact stored under ``key`` is served at"""
+    if STORAGE_BACKEND == "local":
+        return f"{LOCAL_STORAGE_URL.rstrip('/')}/{key}"
+    return get_object_url(key)
+
+
+def get_artifact_key(url: str) -> str:
+    """Key an artifact served at ``url`` is stored under"""
+    prefix = get_artifact_url("")
+    if not url.startswith(prefix):
+        raise ValueError(f"'{url}' is not the URL of an artifact")
+    return url[len(prefix) :]
+
+
+def open_artifact_upload(key: str) -> MultipartUpload | LocalUpload:
+    """Upload written chunk by chunk, to use as a context manager"""
+    if STORAGE_BACKEND == "local":
+        return LocalUpload(key=key)
+    return MultipartUpload(key=key)
+
+
+@traced("storage.upload_artifact")
+def upload_artifact(data: bytes, key: str) -> str:
+    """Store an artifact
+
+    :returns: the URL the artifact is served at
+    """
+    if STORAGE_BACKEND == "local":
+        with LocalUpload(key=key) as local_upload:
+            local_upload.write(data)
+        return local_upload.url
+    return upload_to_s3(data=data, key=key)
+
+
+@traced("storage.read_artifact")
+def read_artifact(url: str, timeout: float = 30) -> bytes:
+    """Content of an artifact, from the URL it was stored at"""
+    local_prefix = f"{LOCAL_STORAGE_URL.rstrip('/')}/"
+    if STORAGE_BACKEND == "local" and url.startswith(local_prefix):
+        return (Path(LOCAL_STORAGE_DIR) / url[len(local_prefix) :]).read_bytes()
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read()
+
+
+@traced("storage.artifact_exists")
+def artifact_exists(key: str) -> bool:
+    if STORAGE_BACKEND == "local":
+        return (Path(LOCAL_STORAGE_DIR) / key).is_file()
+    from botocore.exceptions import ClientError
+
+    try:
+        get_s3_client().head_object(Bucket=OBJECT_STORAGE_BUCKET, Key=key)
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] in ("404", "NoSuchKey"):
+            return False
+        raise
+    return True
+
+
+@traced("storage.move_artifact")
+def move_artifact(key: str, destination_key: str, cache_control: str | None = None):
+    """Move an artifact to ``destination_key``, replacing the artifact stored
+    there, ``cache_control`` is only sent by the object storage"""
+    if STORAGE_BACKEND == "local":
+        destination_path = Path(LOCAL_STORAGE_DIR) / destination_key
+        destination_path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(Path(LOCAL_STORAGE_DIR) / key, destination_path)
+        return
+    s3client = get_s3_client()
+    # copied by the object storage, the artifact is not downloaded
+    s3client.copy_object(
+        Bucket=OBJECT_STORAGE_BUCKET,
+        Key=destination_key,
+        CopySource={"Bucket": OBJECT_STORAGE_BUCKET, "Key": key},
+        ACL="public-read",
+        **(
+            {"CacheControl": cache_control, "MetadataDirective": "REPLACE"}
+            if cache_control is not None
+            else {}
+        ),
+    )
+    s3client.delete_object(Bucket=OBJECT_STORAGE_BUCKET, Key=key)
+
+
+@traced("storage.delete_artifact")
+def delete_artifact(key: str):
+    if STORAGE_BACKEND == "local":
+        (Path(LOCAL_STORAGE_DIR) / key).unlink(missing_ok=True)
+        return
+    get_s3_client().delete_object(Bucket=OBJECT_STORAGE_BUCKET, Key=key)
@@ -0,0 +1,169 @@
+"""OpenTelemetry tracing of the API, the Celery tasks and their storage calls
+
+Tracing is disabled unless ``OPAQUE_REGISTRY_TRACING_EXPORTER`` is set to one
+of:
+
+- ``console``: spans are printed on stdout
+- ``file``: spans are appended as JSON lines to ``OPAQUE_REGISTRY_TRACING_FILE``
+- ``otlp``: spans are sent to an OTLP/HTTP collector, configured with the
+  standard ``OTEL_EXPORTER_OTLP_*`` environment variables (requires the
+  ``opentelemetry-exporter-otlp-proto-http`` package)
+
+When disabled, the OpenTelemetry API falls back to no-op spans.
+"""
+import functools
+import inspect
+import os
+import threading
+from collections.abc import Sequence
+from contextlib import contextmanager
+
+from opentelemetry import context, propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    ConsoleSpanExporter,
+    SpanExporter,
+    SpanExportResult,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+TRACING_EXPORTER = os.getenv("OPAQUE_REGISTRY_TRACING_EXPORTER", "none")
+TRACING_FILE = os.getenv("OPAQUE_REGISTRY_TRACING_FILE", "traces.jsonl")
+
+tracer = trace.get_tracer("opaque_registry")
+
+
+class JsonLinesFileSpanExporter(SpanExporter):
+    """Appends finished spans to a file, one JSON document per line"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = "".join(span.to_json(indent=None) + "\n" for span in spans)
+        with self._lock, open(self.path, "a", encoding="utf-8") as spans_file:
+            spans_file.write(lines)
+        return SpanExportResult.SUCCESS
+
+
+def create_span_exporter(exporter_name: str) -> SpanExporter | None:
+    if exporter_name == "none":
+        return None
+    if exporter_name == "console":
+        return ConsoleSpanExporter()
+    if exporter_name == "file":
+        return JsonLinesFileSpanExporter(path=TRACING_FILE)
+    if exporter_name == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+                OTLPSpanExporter,
+            )
+        except ImportError as exc:
+            raise RuntimeError(
+                "the otlp tracing exporter requires the "
+                "opentelemetry-exporter-otlp-proto-http package"
+            ) from exc
+        return OTLPSpanExporter()
+    raise ValueError(f"unknown tracing exporter '{exporter_name}'")
+
+
+def init_tracing(service_name: str):
+    """Install the tracer provider of the current process, must be called
+    after forking since span processors run a background thread"""
+    span_exporter = create_span_exporter(TRACING_EXPORTER)
+    if span_exporter is None:
+        return
+    tracer_provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name})
+    )
+    tracer_provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    trace.set_tracer_provider(tracer_provider)
+
+
+def shutdown_tracing():
+    tracer_provider = trace.get_tracer_provider()
+    if isinstance(tracer_provider, TracerProvider):
+        tracer_provider.shutdown()
+
+
+def traced(name: str | None = None):
+    """Run the decorated function, sync or async, in its own span"""
+
+    def decorator(func):
+        span_name = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.start_as_current_span(span_name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.start_as_current_span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def inject_trace_context() -> dict[str, str]:
+    """Serialize the current trace context (W3C ``traceparent`` headers)"""
+    carrier = {}
+    propagate.inject(carrier)
+    return carrier
+
+
+@contextmanager
+def attached_trace_context(carrier: dict[str, str] | None):
+    """Make spans created in this block children of a serialized context"""
+    token = context.attach(propagate.extract(carrier or {}))
+    try:
+        yield
+    finally:
+        context.detach(token)
+
+
+def _before_cursor_execute(
+    conn, cursor, statement, parameters, execution_context, executemany
+):
+    span = tracer.start_span(
+        f"db {statement.split(None, 1)[0].upper()}",
+        kind=trace.SpanKind.CLIENT,
+        attributes={"db.system": "postgresql", "db.statement": statement},
+    )
+    execution_context._opaque_registry_span = span
+
+
+def _after_cursor_execute(
+    conn, cursor, statement, parameters, execution_context, executemany
+):
+    span = getattr(execution_context, "_opaque_registry_span", None)
+    if span is not None:
+        span.set_attribute("db.rowcount", cursor.rowcount)
+        span.end()
+
+
+def _handle_db_error(exception_context):
+    execution_context = exception_context.execution_context
+    span = getattr(execution_context, "_opaque_registry_span", None)
+    if span is not None:
+        span.record_exception(exception_context.original_exception)
+        span.set_status(trace.StatusCode.ERROR)
+        span.end()
+
+
+def instrument_engine_tracing(engine: Engine):
+    """Create a child span for every statement executed by the engine"""
+    if TRACING_EXPORTER == "none":
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_db_error)
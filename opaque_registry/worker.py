@@ -0,0 +1,65 @@
+"""Celery worker consuming one task queue
+
+Each queue has its own workers so whole index builds or shard rebuilds never
+delay the publication of a new version. The concurrency, prefetch multiplier
+and metrics port of the worker default to the settings of its queue, read
+from ``OPAQUE_REGISTRY_<QUEUE>_CONCURRENCY``,
+``OPAQUE_REGISTRY_<QUEUE>_PREFETCH`` and
+``OPAQUE_REGISTRY_<QUEUE>_METRICS_PORT``.
+
+Usage: ``python -m opaque_registry.worker {shards,index,maintenance} [celery worker options]``
+"""
+import argparse
+import os
+
+from opaque_registry.async_tasks.dispatch import (
+    INDEX_QUEUE,
+    MAINTENANCE_QUEUE,
+    SHARDS_QUEUE,
+    TASK_QUEUES,
+)
+
+# queue -> (concurrency, prefetch multiplier, metrics port)
+DEFAULT_QUEUE_SETTINGS = {
+    SHARDS_QUEUE: (4, 1, 9808),
+    # index builds are serialized by their lock, more workers would only wait
+    INDEX_QUEUE: (1, 1, 9809),
+    MAINTENANCE_QUEUE: (4, 1, 9810),
+}
+
+
+def get_queue_settings(queue: str) -> tuple[int, int, int]:
+    concurrency, prefetch, metrics_port = DEFAULT_QUEUE_SETTINGS[queue]
+    prefix = f"OPAQUE_REGISTRY_{queue.upper()}"
+    return (
+        int(os.getenv(f"{prefix}_CONCURRENCY", str(concurrency))),
+        int(os.getenv(f"{prefix}_PREFETCH", str(prefetch))),
+        int(os.getenv(f"{prefix}_METRICS_PORT", str(metrics_port))),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("queue", choices=TASK_QUEUES)
+    args, worker_args = parser.parse_known_args()
+
+    concurrency, prefetch, metrics_port = get_queue_settings(args.queue)
+    # workers of several queues may share a host
+    os.environ.setdefault("OPAQUE_REGISTRY_WORKER_METRICS_PORT", str(metrics_port))
+    # imported once the metrics port is set
+    from opaque_registry.celery_app import celery_app
+
+    celery_app.worker_main(
+        [
+            "worker",
+            f"--queues={args.queue}",
+            f"--concurrency={concurrency}",
+            f"--prefetch-multiplier={prefetch}",
+            f"--hostname={args.queue}@%h",
+            *worker_args,
+        ]
+    )
+
+
+if __name__ == "__main__":
+    main()
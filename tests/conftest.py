@@ -0,0 +1,62 @@
+"""Tests run against the PostgreSQL database of ``OPAQUE_REGISTRY_TEST_DB_URL``,
+migrated to the latest revision: its registry tables are truncated. The tests
+needing it are skipped when it is not set or empty.
+"""
+import os
+from contextlib import asynccontextmanager
+
+import pytest
+
+TEST_DB_URL = os.getenv("OPAQUE_REGISTRY_TEST_DB_URL") or None
+if TEST_DB_URL is not None:
+    # read on import of opaque_registry.database.connector
+    os.environ["OPAQUE_REGISTRY_DB_URL"] = TEST_DB_URL
+# no broker, the queued tasks are left in the outbox
+os.environ["OPAQUE_REGISTRY_OUTBOX_DISPATCHER"] = "0"
+os.environ["OPAQUE_REGISTRY_EMBEDDED"] = "0"
+os.environ["OPAQUE_REGISTRY_PACKAGE_FILTER"] = "1"
+
+
+@pytest.fixture
+def registry_tables():
+    if TEST_DB_URL is None:
+        pytest.skip("OPAQUE_REGISTRY_TEST_DB_URL is not set")
+    from sqlalchemy import text
+
+    from opaque_registry.database.connector import (
+        create_sync_db_sessionmaker,
+        init_sync_db_engine,
+    )
+    from opaque_registry.database.models.base import Base
+
+    init_sync_db_engine()
+    sessionmaker = create_sync_db_sessionmaker()
+    with sessionmaker() as session:
+        tables = ", ".join(f'"{table.name}"' for table in Base.metadata.sorted_tables)
+        session.execute(text(f"TRUNCATE {tables} CASCADE"))
+        session.execute(
+            text("INSERT INTO shard (id, location, generation) VALUES (0, '', 0)")
+        )
+        session.commit()
+    return sessionmaker
+
+
+@pytest.fixture
+def api_client(registry_tables):
+    """Context manager of a client of the API running in this process, for
+    the event loop of the test"""
+    import httpx
+
+    from opaque_registry.main import app
+
+    @asynccontextmanager
+    async def api_client():
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(
+                # unhandled exceptions are answered with a 500, as by a server
+                transport=httpx.ASGITransport(app=app, raise_app_exceptions=False),
+                base_url="http://registry",
+            ) as client:
+                yield client
+
+    return api_client
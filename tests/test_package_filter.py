@@ -0,0 +1,39 @@
+import asyncio
+
+from sqlalchemy import func, insert, select
+
+import opaque_registry.database.models as db_models
+
+
+async def check_package_created_elsewhere(api_client, sessionmaker) -> list[bool]:
+    """:returns: whether the filter lets through a package created by another
+    worker, before its notification is received, and an unknown package"""
+    # imported once the database URL is set, see conftest.py
+    from opaque_registry.services.package_filter import (
+        PACKAGE_CREATED_CHANNEL,
+        package_id_filter,
+    )
+
+    async with api_client() as client:
+        while package_id_filter._bloom_filter is None:
+            await asyncio.sleep(0.01)
+        # committed without giving the listener a chance to run
+        with sessionmaker() as session:
+            session.execute(insert(db_models.Package).values(id="remote", shard_id=0))
+            session.execute(select(func.pg_notify(PACKAGE_CREATED_CHANNEL, "remote")))
+            session.commit()
+        might_exist = [
+            await package_id_filter.might_exist("remote"),
+            await package_id_filter.might_exist("unknown"),
+        ]
+        response = await client.get("/packages/remote")
+        assert response.status_code == 200, response.text
+    return might_exist
+
+
+def test_filter_miss_waits_for_pending_notifications(registry_tables, api_client):
+    assert asyncio.run(
+        check_package_created_elsewhere(
+            api_client=api_client, sessionmaker=registry_tables
+        )
+    ) == [True, False]
@@ -0,0 +1,67 @@
+import asyncio
+
+from sqlalchemy import select, update
+
+import opaque_registry.database.models as db_models
+
+CROSSING_VERSION_PAIRS = 40
+
+
+async def create_crossing_versions(api_client, sessionmaker) -> list[int]:
+    """Create versions of two packages depending on each other, all at once
+
+    :returns: the status code of each version creation
+    """
+    async with api_client() as client:
+        for package_id in ["package-a", "package-b"]:
+            response = await client.post("/packages/", json={"id": package_id})
+            assert response.status_code == 200, response.text
+            response = await client.post(
+                f"/packages/{package_id}/versions",
+                json={"version": "1.0.0", "url": "https://example.com/1.0.0.zip"},
+            )
+            assert response.status_code == 200, response.text
+        # versions can only depend on published ones
+        with sessionmaker() as session:
+            session.execute(update(db_models.PackageVersion).values(published=True))
+            session.commit()
+        responses = await asyncio.gather(
+            *(
+                client.post(
+                    f"/packages/{package_id}/versions",
+                    json={
+                        "version": f"2.0.{index}",
+                        "url": f"https://example.com/2.0.{index}.zip",
+                        "dependencies": [
+                            {"package_id": dependency, "version": "1.0.0"}
+                        ],
+                    },
+                )
+                for index in range(CROSSING_VERSION_PAIRS)
+                for package_id, dependency in [
+                    ("package-a", "package-b"),
+                    ("package-b", "package-a"),
+                ]
+            )
+        )
+    return [response.status_code for response in responses]
+
+
+def test_crossing_dependencies_do_not_deadlock(registry_tables, api_client):
+    status_codes = asyncio.run(
+        create_crossing_versions(api_client=api_client, sessionmaker=registry_tables)
+    )
+
+    assert status_codes == [200] * CROSSING_VERSION_PAIRS * 2
+    with registry_tables() as session:
+        summaries = session.execute(
+            select(
+                db_models.PackageSummary.package_id,
+                db_models.PackageSummary.version_count,
+                db_models.PackageSummary.dependent_count,
+            ).order_by(db_models.PackageSummary.package_id)
+        ).all()
+    assert summaries == [
+        ("package-a", CROSSING_VERSION_PAIRS + 1, CROSSING_VERSION_PAIRS),
+        ("package-b", CROSSING_VERSION_PAIRS + 1, CROSSING_VERSION_PAIRS),
+    ]